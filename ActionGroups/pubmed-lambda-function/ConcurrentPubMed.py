@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from PubMed import PubMed, _apply_budget
+
+
+class ConcurrentPubMed(PubMed):
+    """
+    PubMed client that runs independent esearch/efetch calls in parallel.
+    All threads draw from the same shared rate limiter, so the NCBI limit
+    holds no matter how many calls are in flight.
+
+    """
+    max_workers: int = 4
+
+    def run_many(self, queries: Iterable[str]) -> list:
+        """
+        Run several PubMed searches concurrently.
+        Results are returned in the order of `queries`.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(queries))) as pool:
+            return list(pool.map(self.run, queries))
+
+    def run_multi(
+        self,
+        queries: Iterable[str],
+        top_k: Optional[int] = None,
+        limit_chars: bool = True,
+        max_results: Optional[int] = None,
+    ) -> list:
+        """
+        Run closely related searches as one: esearch runs concurrently for
+        every query, results are merged and de-duplicated by PMID, and each
+        unique article is fetched once. Every result lists the queries that
+        found it under "Queries". Results are interleaved by rank so each
+        query's best hits come first.
+
+        Articles are fetched in rank order, one efetch chunk at a time, until
+        the character budget is spent; at most `max_results` are fetched.
+        """
+        try:
+            queries = [query[: self.MAX_QUERY_LENGTH] for query in queries]
+            if not queries:
+                return "No PubMed query was given"
+            top_k = self.top_k_results if top_k is None else top_k
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(queries))) as pool:
+                searches = list(pool.map(lambda query: self.search(query, retmax=top_k), queries))
+
+            provenance: Dict[str, List[str]] = {}
+            for rank in range(max(len(idlist) for idlist, _ in searches)):
+                for query, (idlist, _) in zip(queries, searches):
+                    if rank < len(idlist):
+                        provenance.setdefault(idlist[rank], []).append(query)
+
+            uids = list(provenance)[:max_results]
+            max_chars = self.doc_content_chars_max if limit_chars else None
+            # with a budget, fetch a chunk at a time and stop once it is spent;
+            # without one, _fetch_articles fetches the chunks concurrently
+            step = self.efetch_chunk_size if max_chars is not None else len(uids) or 1
+            results: List[dict] = []
+            remaining_chars = max_chars
+            for start in range(0, len(uids), step):
+                # ids are enough for efetch; each query has its own WebEnv
+                articles = self.retrieve_articles(uids[start : start + step], "")
+                kept, remaining_chars = _apply_budget(articles, remaining_chars)
+                results.extend(kept)
+                if remaining_chars == 0:
+                    break
+
+            docs = []
+            for result in results:
+                docs.append({
+                    "Link": 'https://pubmed.ncbi.nlm.nih.gov/' + result["uid"],
+                    "Published": result["Published"],
+                    "Title": result["Title"],
+                    "Summary": result["Summary"],
+                    "Queries": provenance[result["uid"]],
+                })
+
+            return (
+                docs
+                if docs
+                else "No good PubMed Result was found"
+            )
+        except Exception as ex:
+            return f"PubMed exception: {ex}"
+
+    def load_many(self, queries: Iterable[str]) -> List[List[dict]]:
+        queries = [query[: self.MAX_QUERY_LENGTH] for query in queries]
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(queries))) as pool:
+            return list(pool.map(self.load, queries))
+
+    def _fetch_articles(self, uids: List[str], webenv: str) -> List[dict]:
+        """
+        Split large id lists into chunks and fetch the chunks concurrently.
+        """
+        if len(uids) <= self.efetch_chunk_size:
+            return super()._fetch_articles(uids, webenv)
+        chunks = [
+            uids[i : i + self.efetch_chunk_size]
+            for i in range(0, len(uids), self.efetch_chunk_size)
+        ]
+        fetch = super()._fetch_articles
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+            results = pool.map(lambda chunk: fetch(chunk, webenv), chunks)
+            return [article for chunk in results for article in chunk]
@@ -1,15 +1,27 @@
+import datetime
 import json
 import logging
-import time
-import urllib.error
+import os
+import re
 import urllib.parse
-import urllib.request
-from typing import Any, Dict, Iterator, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import xmltodict
 
+from cache import TieredCache, build_cache
+from http_pool import ConnectionPool, default_pool
+from local_index import LocalIndex, open_index
+from pmc import DEFAULT_SECTIONS, chunk_sections, extract_sections
+from pubmed_xml import iter_articles
+from rate_limiter import get_limiter
+from rerank import Reranker, build_reranker
+from watch import SavedSearchStore
+from retry import RetryPolicy, get_breaker
+
 
 logger = logging.getLogger(__name__)
 
+_QUERY_SYNTAX_RE = re.compile(r"(\[[^\]]*\]|\b(?:AND|OR|NOT)\b)")
+
 class PubMed():
     """
     Calls pubmed API to fetch biomedical literature.
@@ -19,24 +31,88 @@ class PubMed():
         "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?"
     )
     base_url_efetch: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?"
+    base_url_elink: str = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi?"
     max_retry: int = 5
     sleep_time: float = 0.2
+    max_sleep_time: float = 10.0
+    # absolute time.monotonic() after which no retry is attempted
+    deadline: Optional[float] = None
+    batch_retrieval: bool = True
+    # parse efetch XML incrementally with pubmed_xml instead of xmltodict
+    streaming_parse: bool = True
     
-    top_k_results: int = 5
+    top_k_results: int = int(os.environ.get("PUBMED_TOP_K", 5))
+    # esearch page size used by iter_batches
+    page_size: int = 100
+    # ids per efetch call while a character budget applies
+    efetch_chunk_size: int = 20
     MAX_QUERY_LENGTH: int = 300
     doc_content_chars_max: int = 10000
     email: str = "email@example.com"
+    api_key: str = os.environ.get("NCBI_API_KEY", "")
+    # parsed articles keyed by PMID, shared by all clients in the container
+    article_cache: TieredCache = build_cache(
+        "articles", ttl=float(os.environ.get("PUBMED_ARTICLE_CACHE_TTL", 7 * 24 * 3600))
+    )
+    # keep-alive connections to eutils, reused across warm invocations
+    http_pool: ConnectionPool = default_pool
+    # PMC full-text sections and PMID -> PMCID links
+    pmc_cache: TieredCache = build_cache(
+        "pmc", ttl=float(os.environ.get("PUBMED_PMC_CACHE_TTL", 30 * 24 * 3600))
+    )
+    # "eutils", or "local" to answer from the SQLite index at
+    # PUBMED_INDEX_PATH (a path or s3:// URL) and use eutils only on a miss
+    backend: str = os.environ.get("PUBMED_BACKEND", "eutils")
+    local_index_location: str = os.environ.get("PUBMED_INDEX_PATH", "")
+    _local_index: Optional[LocalIndex] = None
+    # rerank a larger candidate pool by embedding similarity before
+    # returning top_k results
+    rerank: bool = os.environ.get("PUBMED_RERANK", "false").lower() == "true"
+    rerank_pool_size: int = int(os.environ.get("PUBMED_RERANK_POOL_SIZE", 50))
+    _reranker: Optional[Reranker] = None
+    _saved_searches: Optional[SavedSearchStore] = None
+    # esearch idlists keyed by result count and normalized query
+    query_cache: TieredCache = build_cache(
+        "queries", ttl=float(os.environ.get("PUBMED_QUERY_CACHE_TTL", 24 * 3600))
+    )
 
 
     
-    def run(self, query: str) -> str:
+    def run(self, query: str, top_k: Optional[int] = None, limit_chars: bool = True) -> str:
         """
         Run PubMed search and get the article meta information.
+        At most `top_k` articles (default top_k_results) are returned and,
+        unless `limit_chars` is False, their titles and summaries together
+        stay within doc_content_chars_max.
         """
 
         try:
+            query = query[: self.MAX_QUERY_LENGTH]
+            top_k = self.top_k_results if top_k is None else top_k
+            max_chars = self.doc_content_chars_max if limit_chars else None
+            if self.rerank:
+                candidates = [
+                    article
+                    for batch in self.iter_batches(query, max_results=max(top_k, self.rerank_pool_size))
+                    for article in batch
+                ]
+                try:
+                    ranked = self.reranker.rerank(query, candidates, top_k)
+                except Exception as e:
+                    logger.warning(f"Reranking failed, using eutils order: {e}")
+                    ranked = candidates[:top_k]
+                results, _ = _apply_budget(ranked, max_chars)
+            else:
+                results = [
+                    article
+                    for batch in self.iter_batches(
+                        query, max_results=top_k, max_chars=max_chars
+                    )
+                    for article in batch
+                ]
+
             docs = []
-            for result in self.load(query[: self.MAX_QUERY_LENGTH]):
+            for result in results:
                 docs.append({
                     "Link": 'https://pubmed.ncbi.nlm.nih.gov/' + result["uid"],
                     "Published": result["Published"],
@@ -51,26 +127,246 @@ class PubMed():
             )
         except Exception as ex:
             return f"PubMed exception: {ex}"
-            
+
+    def iter_batches(
+        self,
+        query: str,
+        max_results: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[List[dict]]:
+        """
+        Page through the search results with esearch retstart and yield each
+        page of articles as soon as it has been fetched. Articles already
+        yielded are skipped. Stops after `max_results` articles (default
+        top_k_results) or once titles and summaries reach `max_chars`; the
+        summary of the article that crosses the character budget is cut short.
+        With `max_chars`, pages are fetched efetch_chunk_size articles at a
+        time so nothing past the budget is fetched.
+        """
+        max_results = self.top_k_results if max_results is None else max_results
+        batch_size = batch_size or self.page_size
+        remaining_chars = max_chars
+
+        if self.backend == "local":
+            try:
+                articles = self.local_index.search(query, max_results)
+            except Exception as e:
+                logger.warning(f"Local index unavailable, using eutils: {e}")
+                articles = []
+            if articles and len(articles) >= max_results:
+                batch, _ = _apply_budget(articles, remaining_chars)
+                yield batch
+                return
+            logger.info("Local index miss, falling back to eutils")
+
+        seen = set()
+        retstart = 0
+        while len(seen) < max_results:
+            retmax = min(batch_size, max_results - len(seen))
+            idlist, webenv = self.search(query, retmax=retmax, retstart=retstart)
+            retstart += len(idlist)
+            new_uids = [uid for uid in idlist if uid not in seen]
+            seen.update(new_uids)
+
+            # with a budget, fetch a chunk at a time and stop once it is spent
+            step = self.efetch_chunk_size if remaining_chars is not None else len(new_uids) or 1
+            for start in range(0, len(new_uids), step):
+                batch, remaining_chars = _apply_budget(
+                    self.retrieve_articles(new_uids[start : start + step], webenv), remaining_chars
+                )
+                if batch:
+                    yield batch
+                if remaining_chars == 0:
+                    return
+            if len(idlist) < retmax:
+                return
+
     def lazy_load(self, query: str) -> Iterator[dict]:
         """
         Search PubMed for documents matching the query.
         Return an iterator of dictionaries containing the document metadata.
         """
 
+        idlist, webenv = self.search(query)
+        if self.batch_retrieval:
+            yield from self.retrieve_articles(idlist, webenv)
+        else:
+            for uid in idlist:
+                yield self.retrieve_article(uid, webenv)
+
+    def search(
+        self,
+        query: str,
+        retmax: Optional[int] = None,
+        retstart: int = 0,
+        filters: Optional[Dict[str, str]] = None,
+        use_cache: bool = True,
+    ) -> Tuple[List[str], str]:
+        """
+        Run esearch for the query and return the matching PMIDs and the
+        history server WebEnv. `retmax` (default top_k_results) PMIDs are
+        returned, starting at result number `retstart`. `filters` are extra
+        esearch parameters such as mindate/maxdate. Unless `use_cache` is
+        False, results are served from the query cache when the same
+        normalized query was run recently; the WebEnv is then empty.
+        """
+        retmax = self.top_k_results if retmax is None else retmax
+        extra = urllib.parse.urlencode(sorted((filters or {}).items()))
+        cache_key = f"{retstart}:{retmax}:{extra}:{normalize_query(query)}"
+        cached = self.query_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            return cached["idlist"], ""
+
         url = (
             self.base_url_esearch
             + "db=pubmed&term="
             + str({urllib.parse.quote(query)})
-            + f"&retmode=json&retmax={self.top_k_results}&usehistory=y"
+            + f"&retmode=json&retmax={retmax}&retstart={retstart}&usehistory=y"
+            + ("&" + extra if extra else "")
         )
-        result = urllib.request.urlopen(url)
-        text = result.read().decode("utf-8")
+        with self._urlopen(url) as result:
+            text = result.read().decode("utf-8")
         json_text = json.loads(text)
 
         webenv = json_text["esearchresult"]["webenv"]
-        for uid in json_text["esearchresult"]["idlist"]:
-            yield self.retrieve_article(uid, webenv)
+        idlist = json_text["esearchresult"]["idlist"]
+        if use_cache:
+            self.query_cache.set(
+                cache_key, {"idlist": idlist, "retmax": retmax, "retstart": retstart}
+            )
+        return idlist, webenv
+
+    def watch(self, query: str, max_results: int = 200, initial_days: int = 30) -> dict:
+        """
+        Saved-search mode: return only articles added to PubMed since the
+        last watch of this query. The first run looks back `initial_days`
+        days. Later runs search from the previous run date (esearch
+        mindate on the Entrez date) and drop PMIDs already reported.
+
+        At most `max_results` new articles are returned. If there are more,
+        the run date is not advanced and "more" is set; the next run searches
+        the same window again and reports the articles this one left out.
+        """
+        query = query[: self.MAX_QUERY_LENGTH]
+        key = normalize_query(query)
+        state = self.saved_searches.get(key)
+        today = datetime.date.today().strftime("%Y/%m/%d")
+        since = state["last_run"] if state is not None else None
+        if since is None:
+            filters = {"datetype": "edat", "reldate": str(initial_days)}
+        else:
+            filters = {"datetype": "edat", "mindate": since, "maxdate": today}
+        seen = set(state["seen_pmids"]) if state is not None else set()
+
+        found: List[str] = []
+        new_uids: List[str] = []
+        retstart = 0
+        more = False
+        while not more:
+            # never cached: a rerun later today must see newly added articles
+            idlist, _ = self.search(
+                query, retmax=self.page_size, retstart=retstart, filters=filters, use_cache=False
+            )
+            retstart += len(idlist)
+            for uid in idlist:
+                if uid in seen or uid in new_uids:
+                    continue
+                if len(new_uids) >= max_results:
+                    more = True
+                    break
+                new_uids.append(uid)
+            found.extend(idlist)
+            if len(idlist) < self.page_size:
+                break
+
+        articles = self.retrieve_articles(new_uids, "")
+        if more:
+            # keep the old window and remember everything reported so far
+            state = {"query": query, "last_run": since, "seen_pmids": sorted(seen.union(new_uids))}
+        else:
+            # mindate is inclusive, so only PMIDs from the boundary day matter
+            state = {"query": query, "last_run": today, "seen_pmids": found}
+        self.saved_searches.put(key, state)
+        return {
+            "query": query,
+            "since": since,
+            "until": today,
+            "new_pmids": [article["uid"] for article in articles],
+            "new": articles,
+            "more": more,
+        }
+
+    def full_text(
+        self,
+        pmids: List[str],
+        sections: Iterable[str] = DEFAULT_SECTIONS,
+        chunk_chars: int = 2000,
+        max_chars: Optional[int] = 20000,
+    ) -> Dict[str, Any]:
+        """
+        Fetch open-access full text from PMC and return, per PMID, the
+        requested sections ("results", "methods", "tables", ...) as chunks
+        of at most `chunk_chars` characters, up to `max_chars` per article.
+        PMIDs without PMC full text map to an explanatory string.
+        """
+        sections = sorted(set(sections))
+        pmcids = self.pmc_ids(pmids)
+        result: Dict[str, Any] = {}
+        for pmid in pmids:
+            pmcid = pmcids.get(pmid)
+            if not pmcid:
+                result[pmid] = "No full text available in PMC"
+                continue
+            cache_key = f"PMC{pmcid}:{','.join(sections)}"
+            extracted = self.pmc_cache.get(cache_key)
+            if extracted is None:
+                url = self.base_url_efetch + "db=pmc&retmode=xml&id=" + pmcid
+                with self._urlopen(url) as response:
+                    extracted = extract_sections(response, sections)
+                self.pmc_cache.set(cache_key, extracted)
+            chunks = chunk_sections(extracted, chunk_chars, max_chars)
+            result[pmid] = (
+                [dict(chunk, pmcid=f"PMC{pmcid}") for chunk in chunks]
+                if chunks
+                else f"PMC{pmcid} has none of the sections {', '.join(sections)}"
+            )
+        return result
+
+    def pmc_ids(self, pmids: List[str]) -> Dict[str, str]:
+        """
+        Map PMIDs to numeric PMC ids with elink; PMIDs that are not in PMC
+        are left out.
+        """
+        links: Dict[str, str] = {}
+        missing = []
+        for pmid in pmids:
+            pmcid = self.pmc_cache.get(f"pmid:{pmid}")
+            if pmcid is None:
+                missing.append(pmid)
+            elif pmcid:
+                links[pmid] = pmcid
+        if not missing:
+            return links
+
+        url = (
+            self.base_url_elink
+            + "dbfrom=pubmed&db=pmc&linkname=pubmed_pmc&retmode=json&"
+            + "&".join("id=" + pmid for pmid in missing)
+        )
+        with self._urlopen(url) as response:
+            json_text = json.loads(response.read().decode("utf-8"))
+        for linkset in json_text.get("linksets", []):
+            for pmid in linkset.get("ids", []):
+                pmcid = ""
+                for linksetdb in linkset.get("linksetdbs", []):
+                    if linksetdb.get("linkname") == "pubmed_pmc" and linksetdb.get("links"):
+                        pmcid = str(linksetdb["links"][0])
+                # cache misses too, so we do not ask again for every call
+                self.pmc_cache.set(f"pmid:{pmid}", pmcid)
+                if pmcid:
+                    links[str(pmid)] = pmcid
+        return links
 
     def load(self, query: str) -> List[dict]:
         """
@@ -82,36 +378,105 @@ class PubMed():
         return data
 
     def retrieve_article(self, uid: str, webenv: str) -> dict:
+        article = self.article_cache.get(uid)
+        if article is not None:
+            return article
         url = (
             self.base_url_efetch
             + "db=pubmed&retmode=xml&id="
             + uid
-            + "&webenv="
-            + webenv
+            + _webenv_param(webenv)
         )
+        with self._urlopen(url) as result:
+            if self.streaming_parse:
+                article = next(iter_articles(result), None)
+                if article is None:
+                    raise ValueError(f"efetch returned no article for {uid}")
+            else:
+                xml_text = result.read().decode("utf-8")
+                text_dict = xmltodict.parse(xml_text)
+                article = self._parse_article(uid, text_dict)
+        self.article_cache.set(uid, article)
+        return article
 
-        retry = 0
-        while True:
-            try:
-                result = urllib.request.urlopen(url)
-                break
-            except urllib.error.HTTPError as e:
-                if e.code == 429 and retry < self.max_retry:
-                    # Too Many Requests errors
-                    # wait for an exponentially increasing amount of time
-                    logger.warning( 
-                        f"Too Many Requests, "
-                        f"waiting for {self.sleep_time:.2f} seconds..."
-                    )
-                    time.sleep(self.sleep_time)
-                    self.sleep_time *= 2
-                    retry += 1
-                else:
-                    raise e
+    def retrieve_articles(self, uids: List[str], webenv: str) -> List[dict]:
+        """
+        Fetch several articles, serving what we can from the article cache
+        and getting the rest with a single efetch call.
+        Articles are returned in the order of `uids`; ids that efetch
+        does not return are skipped.
+        """
+        articles = self.article_cache.get_many(uids)
+        missing = [uid for uid in dict.fromkeys(uids) if uid not in articles]
+        if missing:
+            fetched = {article["uid"]: article for article in self._fetch_articles(missing, webenv)}
+            self.article_cache.set_many(fetched)
+            articles.update(fetched)
+        return [articles[uid] for uid in uids if uid in articles]
 
-        xml_text = result.read().decode("utf-8")
+    def _fetch_articles(self, uids: List[str], webenv: str) -> List[dict]:
+        url = (
+            self.base_url_efetch
+            + "db=pubmed&retmode=xml&id="
+            + ",".join(uids)
+            + _webenv_param(webenv)
+        )
+        with self._urlopen(url) as result:
+            if self.streaming_parse:
+                return list(iter_articles(result))
+            xml_text = result.read().decode("utf-8")
         text_dict = xmltodict.parse(xml_text)
-        return self._parse_article(uid, text_dict)
+        return list(self._parse_article_set(text_dict))
+
+    @property
+    def local_index(self) -> LocalIndex:
+        # opened once per container and shared by all clients
+        if PubMed._local_index is None:
+            PubMed._local_index = open_index(self.local_index_location)
+        return PubMed._local_index
+
+    @property
+    def reranker(self) -> Reranker:
+        if PubMed._reranker is None:
+            PubMed._reranker = build_reranker()
+        return PubMed._reranker
+
+    @property
+    def saved_searches(self) -> SavedSearchStore:
+        if PubMed._saved_searches is None:
+            PubMed._saved_searches = SavedSearchStore()
+        return PubMed._saved_searches
+
+    @property
+    def requests_per_second(self) -> int:
+        # NCBI allows 3 requests/second per client, 10 with an API key
+        return 10 if self.api_key else 3
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return RetryPolicy(self.max_retry, self.sleep_time, self.max_sleep_time)
+
+    def _urlopen(self, url: str):
+        if self.api_key:
+            url += "&api_key=" + urllib.parse.quote(self.api_key)
+        limiter = get_limiter(self.requests_per_second)
+
+        def attempt():
+            limiter.acquire()
+            return self.http_pool.urlopen(url)
+
+        return self.retry_policy.call(
+            attempt, deadline=self.deadline, breaker=get_breaker("eutils")
+        )
+
+    def _parse_article_set(self, text_dict: dict) -> Iterator[dict]:
+        article_set = text_dict.get("PubmedArticleSet") or {}
+        for entry in _as_list(article_set.get("PubmedArticle")):
+            citation = entry["MedlineCitation"]
+            yield self._parse_entry(_pmid(citation), citation["Article"])
+        for entry in _as_list(article_set.get("PubmedBookArticle")):
+            book = entry["BookDocument"]
+            yield self._parse_entry(_pmid(book), book)
 
     def _parse_article(self, uid: str, text_dict: dict) -> dict:
         try:
@@ -120,6 +485,9 @@ class PubMed():
             ]
         except KeyError:
             ar = text_dict["PubmedArticleSet"]["PubmedBookArticle"]["BookDocument"]
+        return self._parse_entry(uid, ar)
+
+    def _parse_entry(self, uid: str, ar: dict) -> dict:
         abstract_text = ar.get("Abstract", {}).get("AbstractText", [])
         summaries = [
             f"{txt['@Label']}: {txt['#text']}"
@@ -153,3 +521,66 @@ class PubMed():
             ),
             "Summary": summary,
         }
+
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a query to the form used as cache key. Search terms match
+    regardless of case, extra whitespace and trailing punctuation, but
+    AND/OR/NOT are only operators in upper case, so those and [field] tags
+    keep their case.
+    """
+    parts = _QUERY_SYNTAX_RE.split(query)
+    # odd indexes are the captured operators and field tags
+    parts[::2] = [part.lower() for part in parts[::2]]
+    return " ".join("".join(parts).split()).strip(" ?!.;,")
+
+
+def _apply_budget(
+    articles: List[dict], remaining_chars: Optional[int]
+) -> Tuple[List[dict], Optional[int]]:
+    """
+    Keep articles until the character budget is used up; None means no
+    budget. Returns the kept articles and the remaining budget.
+    """
+    if remaining_chars is None:
+        return articles, None
+    kept = []
+    for article in articles:
+        article, remaining_chars = _fit_to_budget(article, remaining_chars)
+        if article is not None:
+            kept.append(article)
+        if remaining_chars == 0:
+            break
+    return kept, remaining_chars
+
+
+def _fit_to_budget(article: dict, remaining_chars: int) -> Tuple[Optional[dict], int]:
+    """
+    Charge the article's title and summary against the character budget,
+    shortening the summary if it does not fit. Returns the article, or None
+    when not even its title fits, and the remaining budget.
+    """
+    size = len(article["Title"]) + len(article["Summary"])
+    if size <= remaining_chars:
+        return article, remaining_chars - size
+    ellipsis = "..."
+    allowed = remaining_chars - len(article["Title"]) - len(ellipsis)
+    if allowed < 0:
+        return None, 0
+    return dict(article, Summary=article["Summary"][:allowed] + ellipsis), 0
+
+
+def _webenv_param(webenv: str) -> str:
+    return "&webenv=" + webenv if webenv else ""
+
+
+def _as_list(value: Any) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _pmid(node: dict) -> str:
+    pmid = node.get("PMID", "")
+    return pmid.get("#text", "") if isinstance(pmid, dict) else pmid
@@ -0,0 +1,316 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache():
+    """
+    In-process LRU cache with a per-entry TTL.
+
+    """
+    name = "memory"
+
+    def __init__(self, maxsize: int = 512, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache():
+    """
+    JSON file per entry under `directory`. On Lambda this is meant for /tmp,
+    which persists for the lifetime of a warm container. The oldest files
+    are evicted once more than `max_entries` are stored.
+
+    """
+    name = "disk"
+    prune_every: int = 100
+
+    def __init__(self, directory: str, ttl: Optional[float] = None, max_entries: int = 5000):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, _digest(key) + ".json")
+
+    def get(self, key: str) -> Any:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires") is not None and entry["expires"] < time.time():
+            self.delete(key)
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl if self.ttl else None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "expires": expires, "value": value}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Could not write disk cache entry: {e}")
+            return
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                os.remove(entry.path)
+
+
+class S3Cache():
+    """
+    JSON object per entry in an S3 bucket, shared by every container.
+    Expired objects are ignored on read; use a bucket lifecycle rule on
+    `prefix` to delete them.
+
+    """
+    name = "s3"
+    # concurrent requests for get_many/set_many
+    max_workers: int = 16
+
+    def __init__(self, bucket: str, prefix: str, ttl: Optional[float] = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix.rstrip("/") + "/"
+        self.ttl = ttl
+        self._s3 = boto3.client("s3")
+
+    def _key(self, key: str) -> str:
+        return self.prefix + _digest(key) + ".json"
+
+    def get(self, key: str) -> Any:
+        try:
+            response = self._s3.get_object(Bucket=self.bucket, Key=self._key(key))
+            entry = json.loads(response["Body"].read())
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read S3 cache entry: {e}")
+            return None
+        if entry.get("expires") is not None and entry["expires"] < time.time():
+            return None
+        return entry.get("value")
+
+    def set(self, key: str, value: Any) -> None:
+        expires = time.time() + self.ttl if self.ttl else None
+        body = json.dumps({"key": key, "expires": expires, "value": value})
+        try:
+            self._s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=body.encode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Could not write S3 cache entry: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self._s3.delete_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            logger.warning(f"Could not delete S3 cache entry: {e}")
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Look `keys` up concurrently; returns the ones found."""
+        if not keys:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(keys))) as pool:
+            values = list(pool.map(self.get, keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """Write `items` concurrently."""
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            list(pool.map(lambda item: self.set(*item), items.items()))
+
+    def clear(self) -> None:
+        """
+        Delete every object under `prefix`, a page of up to 1000 at a time.
+        Needs s3:ListBucket and s3:DeleteObject.
+        """
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if not objects:
+                continue
+            response = self._s3.delete_objects(
+                Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True}
+            )
+            errors = response.get("Errors", [])
+            if errors:
+                raise RuntimeError(
+                    f"Could not delete {len(errors)} S3 cache entries under {self.prefix}: {errors[0].get('Message')}"
+                )
+
+
+class TieredCache():
+    """
+    Looks keys up tier by tier (fastest first) and copies hits back into
+    the faster tiers. Writes go to every tier.
+
+    """
+
+    def __init__(self, tiers: List[Any]):
+        self.tiers = tiers
+        self._hits: Dict[str, int] = {tier.name: 0 for tier in tiers}
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                with self._lock:
+                    self._hits[tier.name] += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        Look several keys up at once, tier by tier, so only the keys missed
+        by the faster tiers reach the slower ones. Tiers with a get_many
+        (S3) look their keys up concurrently.
+        """
+        found: Dict[str, Any] = {}
+        remaining = list(dict.fromkeys(keys))
+        for i, tier in enumerate(self.tiers):
+            if not remaining:
+                break
+            if hasattr(tier, "get_many"):
+                hits = tier.get_many(remaining)
+            else:
+                hits = {}
+                for key in remaining:
+                    value = tier.get(key)
+                    if value is not None:
+                        hits[key] = value
+            for key, value in hits.items():
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+            with self._lock:
+                self._hits[tier.name] += len(hits)
+            found.update(hits)
+            remaining = [key for key in remaining if key not in hits]
+        with self._lock:
+            self._misses += len(remaining)
+        return found
+
+    def set(self, key: str, value: Any) -> None:
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        for tier in self.tiers:
+            if hasattr(tier, "set_many"):
+                tier.set_many(items)
+            else:
+                for key, value in items.items():
+                    tier.set(key, value)
+
+    def delete(self, key: str) -> None:
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + self._misses
+            return {
+                "hits": dict(self._hits),
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def build_cache(namespace: str, ttl: Optional[float], memory_size: int = 512) -> TieredCache:
+    """
+    Build the standard memory -> /tmp -> S3 cache for `namespace`.
+    The disk tier lives under PUBMED_CACHE_DIR (default /tmp/pubmed-cache);
+    the S3 tier is only added when PUBMED_CACHE_BUCKET is set.
+    """
+    tiers: List[Any] = [MemoryCache(memory_size, ttl)]
+    cache_dir = os.environ.get("PUBMED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pubmed-cache"))
+    try:
+        tiers.append(DiskCache(os.path.join(cache_dir, namespace), ttl))
+    except OSError as e:
+        logger.warning(f"Disk cache disabled: {e}")
+    bucket = os.environ.get("PUBMED_CACHE_BUCKET")
+    if bucket:
+        prefix = os.environ.get("PUBMED_CACHE_PREFIX", "pubmed-cache")
+        tiers.append(S3Cache(bucket, f"{prefix}/{namespace}", ttl))
+    return TieredCache(tiers)
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
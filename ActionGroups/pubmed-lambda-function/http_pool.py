@@ -0,0 +1,161 @@
+import http.client
+import os
+import threading
+import urllib.error
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+
+# errors raised when a pooled keep-alive connection was closed by the server
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+
+class PooledResponse():
+    """
+    File-like wrapper around http.client.HTTPResponse. The connection goes
+    back to its pool once the body has been read completely; closing the
+    response early discards the connection instead.
+
+    """
+
+    def __init__(self, pool: "ConnectionPool", key: Tuple, conn: http.client.HTTPConnection, response: http.client.HTTPResponse):
+        self._pool = pool
+        self._key = key
+        self._conn: Optional[http.client.HTTPConnection] = conn
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        data = self._response.read(amt)
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def _release(self) -> None:
+        if self._conn is None:
+            return
+        if self._response.will_close:
+            self._conn.close()
+        else:
+            self._pool._put(self._key, self._conn)
+        self._conn = None
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        if self._response.isclosed():
+            self._release()
+        else:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "PooledResponse":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ConnectionPool():
+    """
+    Keep-alive HTTP(S) connections, reused per (scheme, host, port).
+    Up to `maxsize` idle connections are kept for each host; extra ones are
+    closed when released. `connect_timeout` bounds the TCP+TLS handshake and
+    `read_timeout` every socket read after that.
+
+    """
+
+    def __init__(self, maxsize: int = 4, connect_timeout: float = 5.0, read_timeout: float = 20.0):
+        self.maxsize = maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: Dict[Tuple, List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: Tuple) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        scheme, host, port = key
+        conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(host, port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn, False
+
+    def _put(self, key: Tuple, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def urlopen(self, url: str, headers: Optional[Dict[str, str]] = None) -> PooledResponse:
+        """
+        GET `url` on a pooled connection. Error statuses raise
+        urllib.error.HTTPError, like urllib.request.urlopen.
+        """
+        parts = urllib.parse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        conn, reused = self._get(key)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            # the server dropped an idle keep-alive connection; retry once
+            conn, _ = self._get(key)
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+
+        pooled = PooledResponse(self, key, conn, response)
+        if response.status >= 400:
+            body = pooled.read()
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, _BodyReader(body))
+        return pooled
+
+    def clear(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class _BodyReader():
+
+    def __init__(self, body: bytes):
+        self._body = body
+
+    def read(self, amt: Optional[int] = None) -> bytes:
+        body, self._body = self._body, b""
+        return body
+
+    def close(self) -> None:
+        pass
+
+
+# Shared by all clients so connections survive warm Lambda invocations.
+default_pool = ConnectionPool(
+    maxsize=int(os.environ.get("PUBMED_HTTP_POOL_SIZE", 4)),
+    connect_timeout=float(os.environ.get("PUBMED_HTTP_CONNECT_TIMEOUT", 5)),
+    read_timeout=float(os.environ.get("PUBMED_HTTP_READ_TIMEOUT", 20)),
+)
@@ -1,10 +1,27 @@
 import json
 import logging
+import os
+import time
 logger = logging.getLogger()
 logger.setLevel("INFO")
 
-from PubMed import PubMed
-pubmed = PubMed()
+from ConcurrentPubMed import ConcurrentPubMed
+from pmc import DEFAULT_SECTIONS
+from response_format import MIN_SUMMARY_CHARS, format_articles
+pubmed = ConcurrentPubMed()
+
+# seconds kept in reserve to build the response before the Lambda times out
+DEADLINE_MARGIN = 2.0
+# upper bound for the number of articles an agent can ask for
+MAX_TOP_K = 200
+# upper bound for the number of queries in one /query-pubmed-multi call
+MAX_QUERIES = 10
+# upper bound for the number of articles in one /pubmed-fulltext call
+MAX_FULL_TEXT_ARTICLES = 5
+# "text" returns the Python repr of the results, "json" a compact JSON
+# document that fits in RESPONSE_MAX_CHARS
+RESPONSE_FORMAT = os.environ.get("PUBMED_RESPONSE_FORMAT", "text")
+RESPONSE_MAX_CHARS = int(os.environ.get("PUBMED_RESPONSE_MAX_CHARS", 12000))
 
 
 def lambda_handler(event, context):
@@ -14,9 +31,79 @@ def lambda_handler(event, context):
     api_path = event["apiPath"]
     parameters = event["parameters"]
     http_method = event["httpMethod"]
+    pubmed.deadline = (
+        time.monotonic()
+        + context.get_remaining_time_in_millis() / 1000
+        - DEADLINE_MARGIN
+    )
     
-    if api_path == "/query-pubmed":
-        body = pubmed.run(parameters[0]["value"])
+    top_k_error = None
+    if api_path in ("/query-pubmed", "/query-pubmed-multi"):
+        try:
+            top_k = parse_top_k({param["name"]: param["value"] for param in parameters}.get("top_k"))
+        except ValueError as ex:
+            top_k_error = str(ex)
+
+    if top_k_error is not None:
+        body = top_k_error
+        response_code = 400
+        response_body = {"application/json": {"body": str(body)}}
+    elif api_path == "/query-pubmed":
+        params = {param["name"]: param["value"] for param in parameters}
+        query = params.get("query", parameters[0]["value"])
+        if RESPONSE_FORMAT == "json":
+            # format_articles applies its own budget at section boundaries and
+            # cannot fit more than RESPONSE_MAX_CHARS // MIN_SUMMARY_CHARS abstracts
+            top_k = min(
+                pubmed.top_k_results if top_k is None else top_k,
+                RESPONSE_MAX_CHARS // MIN_SUMMARY_CHARS,
+            )
+            body = pubmed.run(query, top_k=top_k, limit_chars=False)
+            if isinstance(body, list):
+                body = format_articles(body, RESPONSE_MAX_CHARS)
+        else:
+            body = pubmed.run(query, top_k=top_k)
+        logger.info(f"Query cache: {pubmed.query_cache.stats()}")
+        logger.info(f"Article cache: {pubmed.article_cache.stats()}")
+        response_body = {"application/json": {"body": str(body)}}
+        response_code = 200
+    elif api_path == "/query-pubmed-multi":
+        params = {param["name"]: param["value"] for param in parameters}
+        queries = parse_queries(params.get("queries", ""))[:MAX_QUERIES]
+        if RESPONSE_FORMAT == "json":
+            # format_articles cannot fit more than this many abstracts
+            body = pubmed.run_multi(
+                queries,
+                top_k=top_k,
+                limit_chars=False,
+                max_results=RESPONSE_MAX_CHARS // MIN_SUMMARY_CHARS,
+            )
+            if isinstance(body, list):
+                body = format_articles(body, RESPONSE_MAX_CHARS)
+        else:
+            body = pubmed.run_multi(queries, top_k=top_k)
+        response_body = {"application/json": {"body": str(body)}}
+        response_code = 200
+    elif api_path == "/pubmed-fulltext":
+        params = {param["name"]: param["value"] for param in parameters}
+        pmids = [pmid.strip() for pmid in params.get("pmids", "").split(",") if pmid.strip()]
+        pmids = pmids[:MAX_FULL_TEXT_ARTICLES]
+        sections = [
+            section.strip().lower()
+            for section in params.get("sections", ",".join(DEFAULT_SECTIONS)).split(",")
+            if section.strip()
+        ]
+        if pmids:
+            try:
+                body = pubmed.full_text(
+                    pmids, sections, max_chars=RESPONSE_MAX_CHARS // len(pmids)
+                )
+                if RESPONSE_FORMAT == "json":
+                    body = json.dumps(body, ensure_ascii=False)
+            except Exception as ex:
+                body = f"PubMed exception: {ex}"
+        else:
+            body = "No PMIDs were given"
         response_body = {"application/json": {"body": str(body)}}
         response_code = 200
     else:
@@ -46,3 +133,31 @@ def lambda_handler(event, context):
     }
         
     return api_response
+
+
+def parse_queries(value):
+    """
+    Accept the queries either as a JSON array of strings or as one query
+    per line (semicolons also separate queries).
+    """
+    try:
+        queries = json.loads(value)
+    except ValueError:
+        queries = None
+    if not isinstance(queries, list):
+        queries = value.replace(";", "\n").split("\n")
+    return [str(query).strip() for query in queries if str(query).strip()]
+
+
+def parse_top_k(value):
+    """
+    The requested number of articles clamped to 1..MAX_TOP_K, or None when
+    not given. Raises ValueError for values that are not a number.
+    """
+    if value is None or str(value).strip() == "":
+        return None
+    try:
+        top_k = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"top_k must be a whole number between 1 and {MAX_TOP_K}, got {value!r}")
+    return max(1, min(top_k, MAX_TOP_K))
@@ -0,0 +1,235 @@
+"""
+Local full-text index of PubMed articles.
+
+Articles are stored in SQLite with an FTS5 index over title and abstract and
+ranked with BM25, so `/query-pubmed` can be answered without calling NCBI.
+Build the index from PubMed baseline/update files
+(https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/) with:
+
+    python local_index.py pubmed.db pubmed24n0001.xml.gz pubmed24n0002.xml.gz ...
+
+Files are applied in the order given, so later update files replace
+earlier versions of an article and remove deleted citations.
+"""
+import argparse
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from typing import Iterable, List, Optional
+
+from pubmed_xml import iter_articles
+
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    pmid INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    published TEXT NOT NULL,
+    copyright TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, summary, content='articles', content_rowid='pmid',
+    tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, summary)
+    VALUES (new.pmid, new.title, new.summary);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, summary)
+    VALUES ('delete', old.pmid, old.title, old.summary);
+END;
+"""
+
+# BM25 column weights for (title, summary)
+TITLE_WEIGHT = 5.0
+SUMMARY_WEIGHT = 1.0
+
+STOPWORDS = frozenset(
+    """a about an and are as at be by do does for from has have how in
+    is it of on or that the their there these this to was what when where
+    which who why with""".split()
+)
+
+
+class LocalIndex():
+    """
+    SQLite FTS5 index of parsed PubMed articles.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self._conn.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self._conn.close()
+            if "fts5" in str(e):
+                raise RuntimeError(
+                    f"SQLite {sqlite3.sqlite_version} was built without FTS5; "
+                    "use a Python runtime whose sqlite3 includes it (e.g. python3.12 on Lambda)"
+                ) from e
+            raise
+        self._lock = threading.Lock()
+
+    def add(self, articles: Iterable[dict]) -> int:
+        """
+        Insert or replace articles; returns the number written.
+        """
+        count = 0
+        with self._lock, self._conn:
+            for article in articles:
+                pmid = int(article["uid"])
+                # delete first so the trigger removes the old FTS entry
+                self._conn.execute("DELETE FROM articles WHERE pmid = ?", (pmid,))
+                self._conn.execute(
+                    "INSERT INTO articles (pmid, title, summary, published, copyright) VALUES (?, ?, ?, ?, ?)",
+                    (
+                        pmid,
+                        article["Title"],
+                        article["Summary"],
+                        article["Published"],
+                        article["Copyright Information"],
+                    ),
+                )
+                count += 1
+        return count
+
+    def delete(self, pmids: Iterable[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM articles WHERE pmid = ?", [(int(pmid),) for pmid in pmids]
+            )
+
+    def get(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pmid, title, summary, published, copyright FROM articles WHERE pmid = ?",
+                (int(uid),),
+            ).fetchone()
+        return _to_article(row) if row else None
+
+    def search(self, query: str, limit: int) -> List[dict]:
+        """
+        Return up to `limit` articles containing every significant term of
+        the query, best BM25 match first.
+        """
+        match = to_match_expression(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.pmid, a.title, a.summary, a.published, a.copyright "
+                "FROM articles_fts JOIN articles a ON a.pmid = articles_fts.rowid "
+                "WHERE articles_fts MATCH ? "
+                "ORDER BY bm25(articles_fts, ?, ?) LIMIT ?",
+                (match, TITLE_WEIGHT, SUMMARY_WEIGHT, limit),
+            ).fetchall()
+        return [_to_article(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM articles").fetchone()[0]
+
+    def optimize(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')")
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def to_match_expression(query: str) -> str:
+    """
+    Turn a free-text query into an FTS5 expression that requires every
+    non-stopword term. Terms are quoted, so FTS5 operators in the query
+    are treated as plain words.
+    """
+    terms = [
+        term
+        for term in re.findall(r"\w+", query.lower())
+        if term not in STOPWORDS
+    ]
+    return " AND ".join(f'"{term}"' for term in terms)
+
+
+def open_index(location: str) -> LocalIndex:
+    """
+    Open an index from a local path or an s3://bucket/key URL. S3 indexes
+    are downloaded to /tmp once per container.
+    """
+    if not location:
+        # sqlite3 would otherwise open an empty temporary database
+        raise ValueError("PUBMED_BACKEND=local requires PUBMED_INDEX_PATH to be set to an index path or s3:// URL")
+    if not location.startswith("s3://"):
+        return LocalIndex(location)
+    import boto3
+
+    bucket, _, key = location[len("s3://"):].partition("/")
+    path = os.path.join(tempfile.gettempdir(), "pubmed-index", os.path.basename(key))
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.info(f"Downloading PubMed index from {location}")
+        boto3.client("s3").download_file(bucket, key, path + ".part")
+        os.replace(path + ".part", path)
+    return LocalIndex(path)
+
+
+def ingest(index: LocalIndex, path: str, batch_size: int = 1000) -> int:
+    """
+    Load one baseline or update file (.xml or .xml.gz) into the index.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    deleted: List[str] = []
+    batch: List[dict] = []
+    count = 0
+    with opener(path, "rb") as f:
+        for article in iter_articles(f, on_delete=deleted.append):
+            if not article["uid"]:
+                continue
+            batch.append(article)
+            if len(batch) >= batch_size:
+                count += index.add(batch)
+                batch = []
+    count += index.add(batch)
+    index.delete(deleted)
+    logger.info(f"{path}: {count} articles indexed, {len(deleted)} deleted")
+    return count
+
+
+def _to_article(row: tuple) -> dict:
+    pmid, title, summary, published, copyright_information = row
+    return {
+        "uid": str(pmid),
+        "Title": title,
+        "Published": published,
+        "Copyright Information": copyright_information,
+        "Summary": summary,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a local PubMed full-text index.")
+    parser.add_argument("index", help="SQLite index file to create or update")
+    parser.add_argument("files", nargs="+", help="PubMed baseline/update XML files (.xml or .xml.gz)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    index = LocalIndex(args.index)
+    for path in args.files:
+        ingest(index, path)
+    index.optimize()
+    logger.info(f"Index contains {index.count()} articles")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Streaming extraction of sections from PMC full text (JATS XML).
+
+Only the requested sections are kept: body sections are matched on their
+sec-type attribute or title ("Results", "Materials and Methods", ...),
+and "tables" collects every table-wrap as caption plus tab-separated rows.
+Everything else is parsed but not stored. The kept text is split into
+chunks of bounded size at paragraph boundaries.
+"""
+import re
+from typing import IO, Dict, Iterable, List, Optional, Union
+
+from xml.parsers import expat
+
+
+DEFAULT_SECTIONS = ("results", "methods", "tables")
+# sec-type values and title words that identify each section kind
+SECTION_ALIASES = {
+    "introduction": ("intro", "introduction", "background"),
+    "methods": ("methods", "materials", "materials|methods", "method", "patients", "experimental"),
+    "results": ("results", "findings"),
+    "discussion": ("discussion", "results|discussion"),
+    "conclusions": ("conclusions", "conclusion"),
+}
+BLOCK_TAGS = frozenset(("p", "title", "label", "list-item"))
+
+
+class _JatsHandler():
+
+    def __init__(self, sections: Iterable[str]):
+        self.wanted = set(sections)
+        self.sections: Dict[str, List[str]] = {}
+        # (section kind or None, title seen) for each open <sec>
+        self.secs: List[List] = []
+        self.text: Optional[List[str]] = None
+        self.text_depth = 0
+        self.in_body = False
+        self.table: Optional[List[str]] = None
+        self.row: Optional[List[str]] = None
+        self.cell: Optional[List[str]] = None
+
+    def _current_kind(self) -> Optional[str]:
+        for kind, _ in reversed(self.secs):
+            if kind:
+                return kind
+        return None
+
+    def start(self, name: str, attrs: Dict[str, str]) -> None:
+        if name == "body":
+            self.in_body = True
+        elif name == "sec" and self.in_body:
+            parent_kind = self._current_kind()
+            kind = parent_kind or _classify(attrs.get("sec-type", ""))
+            self.secs.append([kind, False])
+        elif name == "table-wrap" and "tables" in self.wanted:
+            self.table = []
+        elif name == "tr" and self.table is not None:
+            self.row = []
+        elif name in ("td", "th") and self.row is not None:
+            self.cell = []
+
+        if self.text is not None:
+            self.text_depth += 1
+        elif name in BLOCK_TAGS and (self.secs or self.table is not None):
+            self.text = []
+            self.text_depth = 1
+
+    def end(self, name: str) -> None:
+        if self.text is not None:
+            self.text_depth -= 1
+            if self.text_depth == 0:
+                self._block(name, " ".join("".join(self.text).split()))
+                self.text = None
+
+        if name in ("td", "th") and self.cell is not None:
+            self.row.append(" ".join("".join(self.cell).split()))
+            self.cell = None
+        elif name == "tr" and self.row is not None:
+            self.table.append("\t".join(self.row))
+            self.row = None
+        elif name == "table-wrap" and self.table is not None:
+            self.sections.setdefault("tables", []).append("\n".join(self.table))
+            self.table = None
+        elif name == "sec" and self.secs:
+            self.secs.pop()
+        elif name == "body":
+            self.in_body = False
+
+    def _block(self, name: str, text: str) -> None:
+        if not text:
+            return
+        if self.table is not None:
+            # label, caption title and caption paragraphs lead the table rows
+            self.table.append(text)
+            return
+        sec = self.secs[-1]
+        if name == "title" and not sec[1]:
+            sec[1] = True
+            if sec[0] is None:
+                sec[0] = _classify(text)
+            return
+        kind = self._current_kind()
+        if kind in self.wanted:
+            self.sections.setdefault(kind, []).append(text)
+
+    def data(self, text: str) -> None:
+        if self.cell is not None:
+            self.cell.append(text)
+        elif self.text is not None:
+            self.text.append(text)
+
+
+def _classify(label: str) -> Optional[str]:
+    words = re.findall(r"[a-z]+", label.lower())
+    if not words:
+        return None
+    key = "|".join(word for word in words if word not in ("and", "the", "of"))
+    for kind, aliases in SECTION_ALIASES.items():
+        if key in aliases or words[0] in aliases:
+            return kind
+    return None
+
+
+def extract_sections(
+    source: Union[bytes, str, IO[bytes]],
+    sections: Iterable[str] = DEFAULT_SECTIONS,
+    chunk_size: int = 64 * 1024,
+) -> Dict[str, List[str]]:
+    """
+    Parse a PMC article and return the paragraphs of each requested
+    section kind ("results", "methods", "tables", ...), in document order.
+    """
+    handler = _JatsHandler(sections)
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+    if isinstance(source, (bytes, str)):
+        parser.Parse(source, True)
+    else:
+        while True:
+            chunk = source.read(chunk_size)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+    return handler.sections
+
+
+def chunk_sections(
+    sections: Dict[str, List[str]], chunk_chars: int, max_chars: Optional[int] = None
+) -> List[dict]:
+    """
+    Group paragraphs into chunks of at most `chunk_chars` characters, never
+    mixing sections. Paragraphs longer than a chunk are split at sentence
+    boundaries. Stops once `max_chars` characters have been emitted.
+    """
+    chunks = []
+    total = 0
+    for kind, paragraphs in sections.items():
+        current = ""
+        for paragraph in paragraphs:
+            for piece in _split(paragraph, chunk_chars):
+                if current and len(current) + 1 + len(piece) > chunk_chars:
+                    chunks.append({"section": kind, "text": current})
+                    total += len(current)
+                    current = ""
+                current = current + "\n" + piece if current else piece
+                if max_chars is not None and total + len(current) >= max_chars:
+                    chunks.append({"section": kind, "text": current[: max_chars - total]})
+                    return chunks
+        if current:
+            chunks.append({"section": kind, "text": current})
+            total += len(current)
+    return chunks
+
+
+def _split(text: str, size: int) -> List[str]:
+    """
+    Split text into pieces of at most `size` characters: tables by row,
+    prose by sentence, and anything still too long by hard cut.
+    """
+    if len(text) <= size:
+        return [text]
+    if "\n" in text:
+        units, separator = text.split("\n"), "\n"
+    else:
+        units, separator = re.split(r"(?<=[.!?])\s+", text), " "
+    pieces = []
+    current = ""
+    for unit in units:
+        while len(unit) > size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(unit[:size])
+            unit = unit[size:]
+        if current and len(current) + 1 + len(unit) > size:
+            pieces.append(current)
+            current = ""
+        current = current + separator + unit if current else unit
+    if current:
+        pieces.append(current)
+    return pieces
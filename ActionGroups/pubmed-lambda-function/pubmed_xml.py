@@ -0,0 +1,169 @@
+"""
+Streaming extraction of PubMed efetch XML.
+
+Only the fields the PubMed client returns are collected. Subtrees such as
+MeSH headings, reference lists and author affiliations are skipped without
+building anything, and articles are yielded as soon as their closing tag
+has been parsed, so large multi-article payloads are handled in chunks.
+"""
+from typing import IO, Callable, Dict, Iterator, List, Optional, Union
+
+from xml.parsers import expat
+
+
+ARTICLE_TAGS = ("PubmedArticle", "PubmedBookArticle")
+# elements whose PMID / ArticleTitle / Abstract belong to the article itself
+ARTICLE_CONTAINERS = ("MedlineCitation", "Article", "BookDocument")
+SKIPPED_TAGS = frozenset(
+    (
+        "AuthorList",
+        "ChemicalList",
+        "CommentsCorrectionsList",
+        "GeneSymbolList",
+        "GrantList",
+        "InvestigatorList",
+        "KeywordList",
+        "MeshHeadingList",
+        "OtherAbstract",
+        "PublicationTypeList",
+        "ReferenceList",
+        "SupplMeshList",
+    )
+)
+TEXT_TAGS = frozenset(
+    ("PMID", "ArticleTitle", "AbstractText", "CopyrightInformation", "Year", "Month", "Day")
+)
+
+
+class _ArticleHandler():
+
+    def __init__(self):
+        self.stack: List[str] = []
+        self.skip_depth = 0
+        self.article: Optional[Dict] = None
+        self.text: Optional[List[str]] = None
+        self.label = ""
+        self.done: List[dict] = []
+        self.deleted: List[str] = []
+
+    def start(self, name: str, attrs: Dict[str, str]) -> None:
+        if self.skip_depth:
+            self.skip_depth += 1
+            return
+        if name in SKIPPED_TAGS:
+            self.skip_depth = 1
+            return
+        parent = self.stack[-1] if self.stack else ""
+        self.stack.append(name)
+        if name in ARTICLE_TAGS:
+            self.article = {"uid": "", "title": "", "abstract": [], "copyright": "", "date": {}}
+        elif self.article is None:
+            # update files list withdrawn citations as DeleteCitation/PMID
+            if name == "PMID" and parent == "DeleteCitation":
+                self.text = []
+            return
+        elif self.text is None and name in TEXT_TAGS and self._wanted(name, parent):
+            self.text = []
+            self.label = attrs.get("Label", "")
+
+    def _wanted(self, name: str, parent: str) -> bool:
+        if name == "PMID":
+            return parent in ARTICLE_CONTAINERS and not self.article["uid"]
+        if name == "ArticleTitle":
+            return parent in ARTICLE_CONTAINERS
+        if name in ("AbstractText", "CopyrightInformation"):
+            return parent == "Abstract"
+        return parent == "ArticleDate"
+
+    def end(self, name: str) -> None:
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        self.stack.pop()
+        if self.article is None:
+            if name == "PMID" and self.text is not None:
+                self.deleted.append("".join(self.text).strip())
+                self.text = None
+            return
+        if name in ARTICLE_TAGS:
+            self.done.append(_to_record(self.article))
+            self.article = None
+            self.text = None
+            return
+        # inline markup such as <i> or <sup> only contributes its text
+        if self.text is None or name not in TEXT_TAGS:
+            return
+        text = " ".join("".join(self.text).split())
+        self.text = None
+        if name == "PMID":
+            self.article["uid"] = text
+        elif name == "ArticleTitle":
+            self.article["title"] = text
+        elif name == "AbstractText":
+            self.article["abstract"].append((self.label, text))
+        elif name == "CopyrightInformation":
+            self.article["copyright"] = text
+        else:
+            self.article["date"][name] = text
+
+    def data(self, text: str) -> None:
+        if self.text is not None and not self.skip_depth:
+            self.text.append(text)
+
+
+def _to_record(article: dict) -> dict:
+    summaries = [
+        f"{label}: {text}" if label else text
+        for label, text in article["abstract"]
+        if text
+    ]
+    date = article["date"]
+    return {
+        "uid": article["uid"],
+        "Title": article["title"],
+        "Published": "-".join(
+            [date.get("Year", ""), date.get("Month", ""), date.get("Day", "")]
+        ),
+        "Copyright Information": article["copyright"],
+        "Summary": "\n".join(summaries) if summaries else "No abstract available",
+    }
+
+
+def iter_articles(
+    source: Union[bytes, str, IO[bytes]],
+    chunk_size: int = 64 * 1024,
+    on_delete: Optional[Callable[[str], None]] = None,
+) -> Iterator[dict]:
+    """
+    Parse a PubmedArticleSet and yield one dict per article, with the same
+    keys as PubMed._parse_article. `source` is either the XML itself or a
+    binary file-like object (such as an HTTP response) read in chunks.
+    PMIDs listed under DeleteCitation are passed to `on_delete`.
+    """
+    handler = _ArticleHandler()
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+
+    if isinstance(source, (bytes, str)):
+        parser.Parse(source, True)
+        yield from _drain(handler, on_delete)
+        return
+
+    while True:
+        chunk = source.read(chunk_size)
+        parser.Parse(chunk, not chunk)
+        yield from _drain(handler, on_delete)
+        if not chunk:
+            break
+
+
+def _drain(handler: _ArticleHandler, on_delete: Optional[Callable[[str], None]]) -> Iterator[dict]:
+    done, handler.done = handler.done, []
+    deleted, handler.deleted = handler.deleted, []
+    yield from done
+    if on_delete is not None:
+        for pmid in deleted:
+            on_delete(pmid)
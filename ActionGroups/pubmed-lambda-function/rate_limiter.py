@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket used to keep outgoing NCBI requests under
+    the eutils rate limit. The default capacity of 1 spaces requests
+    1/rate seconds apart, so no one-second window ever holds more than
+    `rate` requests; a larger capacity allows bursts on top of that.
+
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """
+        Take `tokens` if available and return 0, otherwise return the
+        number of seconds until they will be.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1, timeout: Optional[float] = None) -> bool:
+        """
+        Block until `tokens` are available. Return False if that would take
+        longer than `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+# Module-level registry so the buckets outlive a single invocation and are
+# shared by every client in a warm Lambda container.
+_limiters: Dict[float, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(rate: float) -> TokenBucket:
+    with _limiters_lock:
+        if rate not in _limiters:
+            _limiters[rate] = TokenBucket(rate)
+        return _limiters[rate]
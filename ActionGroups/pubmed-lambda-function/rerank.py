@@ -0,0 +1,168 @@
+"""
+Embedding-based rerank of PubMed candidates.
+
+Abstracts are embedded once with a Bedrock embedding model and the vectors
+are kept in one contiguous float32 array that is appended to a file under
+/tmp, so a warm container never embeds the same article twice. Candidates
+are reordered by cosine similarity to the query.
+"""
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+from cache import MemoryCache
+
+
+logger = logging.getLogger(__name__)
+
+# characters of title + abstract sent to the embedding model
+EMBED_CHARS_MAX = 4000
+
+
+class VectorIndex():
+    """
+    Unit-length float32 vectors stored row by row in a single array and
+    mirrored to `<directory>/vectors.f32` plus `<directory>/uids.txt`.
+
+    """
+
+    def __init__(self, directory: str, dimensions: int):
+        self.dimensions = dimensions
+        self.directory = directory
+        self._vectors = array("f")
+        self._rows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._uids_path = os.path.join(directory, "uids.txt")
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._uids_path, encoding="utf-8") as f:
+                uids = f.read().split()
+            with open(self._vectors_path, "rb") as f:
+                self._vectors.frombytes(f.read())
+        except OSError:
+            self._vectors = array("f")
+            return
+        # a write interrupted half way leaves a partial row or a missing uid
+        rows = min(len(uids), len(self._vectors) // self.dimensions)
+        del self._vectors[rows * self.dimensions:]
+        self._rows = {uid: row for row, uid in enumerate(uids[:rows])}
+
+    def __contains__(self, uid: str) -> bool:
+        return uid in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, uid: str, vector: Sequence[float]) -> None:
+        if len(vector) != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got {len(vector)}")
+        row = array("f", _normalize(vector))
+        with self._lock:
+            if uid in self._rows:
+                return
+            self._rows[uid] = len(self._rows)
+            self._vectors.extend(row)
+            try:
+                with open(self._vectors_path, "ab") as f:
+                    f.write(row.tobytes())
+                with open(self._uids_path, "a", encoding="utf-8") as f:
+                    f.write(uid + "\n")
+            except OSError as e:
+                logger.warning(f"Could not persist embedding for {uid}: {e}")
+
+    def similarities(self, query: Sequence[float], uids: List[str]) -> Dict[str, float]:
+        """
+        Cosine similarity between the query vector and each stored uid.
+        """
+        query = _normalize(query)
+        dims = self.dimensions
+        scores = {}
+        with self._lock:
+            for uid in uids:
+                row = self._rows.get(uid)
+                if row is None:
+                    continue
+                start = row * dims
+                scores[uid] = math.fsum(
+                    q * v for q, v in zip(query, self._vectors[start : start + dims])
+                )
+        return scores
+
+
+class BedrockEmbedder():
+    """
+    Text embeddings from an Amazon Titan embedding model on Bedrock.
+
+    """
+
+    def __init__(self, model_id: str = "amazon.titan-embed-text-v2:0", dimensions: int = 512):
+        import boto3
+
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self._client = boto3.client("bedrock-runtime")
+
+    def __call__(self, text: str) -> List[float]:
+        body = json.dumps({"inputText": text, "dimensions": self.dimensions, "normalize": True})
+        response = self._client.invoke_model(body=body, modelId=self.model_id)
+        return json.loads(response["body"].read())["embedding"]
+
+
+class Reranker():
+    """
+    Reorders candidate articles by similarity between the query and each
+    article's title and abstract.
+
+    """
+    max_workers: int = 8
+
+    def __init__(self, embed: Callable[[str], List[float]], index: VectorIndex):
+        self.embed = embed
+        self.index = index
+        self._query_vectors = MemoryCache(maxsize=256)
+
+    def rerank(self, query: str, articles: List[dict], top_k: int) -> List[dict]:
+        missing = [article for article in articles if article["uid"] not in self.index]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                vectors = pool.map(lambda article: self.embed(_article_text(article)), missing)
+                for article, vector in zip(missing, vectors):
+                    self.index.add(article["uid"], vector)
+
+        query_vector = self._query_vectors.get(query)
+        if query_vector is None:
+            query_vector = self.embed(query)
+            self._query_vectors.set(query, query_vector)
+
+        scores = self.index.similarities(query_vector, [article["uid"] for article in articles])
+        ranked = sorted(articles, key=lambda article: scores.get(article["uid"], -1.0), reverse=True)
+        return ranked[:top_k]
+
+
+def build_reranker(model_id: Optional[str] = None, dimensions: int = 512) -> Reranker:
+    """
+    Bedrock-backed reranker whose vectors live under PUBMED_CACHE_DIR.
+    """
+    model_id = model_id or os.environ.get("PUBMED_EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
+    cache_dir = os.environ.get("PUBMED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pubmed-cache"))
+    directory = os.path.join(cache_dir, "embeddings", f"{model_id.replace(':', '_')}-{dimensions}")
+    return Reranker(BedrockEmbedder(model_id, dimensions), VectorIndex(directory, dimensions))
+
+
+def _article_text(article: dict) -> str:
+    return (article["Title"] + "\n" + article["Summary"])[:EMBED_CHARS_MAX]
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(math.fsum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else list(vector)
@@ -0,0 +1,117 @@
+"""
+Compact JSON responses for the PubMed action group.
+
+`format_articles` fits a list of PubMed results into a character budget
+(roughly four characters per model token). Every article keeps its PMID,
+title and link; the remaining budget is shared out across abstracts, which
+are cut at section boundaries where possible. Articles that do not fit at
+all are listed by PMID only, so the agent can ask for them explicitly.
+"""
+import json
+import re
+from typing import List, Tuple
+
+
+TRUNCATION_MARK = " [...]"
+MORE_NOTE = "Search '<pmid>[pmid]' to read a truncated or omitted article in full."
+# never shrink an abstract to less than this; drop the article instead
+MIN_SUMMARY_CHARS = 200
+# only start a section that has to be cut if this much of it fits
+MIN_PARTIAL_SECTION_CHARS = 80
+
+
+def format_articles(docs: List[dict], max_chars: int) -> str:
+    """
+    Serialize the results of PubMed.run as JSON of at most `max_chars`
+    characters.
+    """
+    articles = [
+        {
+            "pmid": doc["Link"].rstrip("/").rsplit("/", 1)[-1],
+            "title": doc["Title"],
+            "published": doc["Published"],
+            "link": doc["Link"],
+            "summary": doc["Summary"],
+            **({"queries": doc["Queries"]} if "Queries" in doc else {}),
+        }
+        for doc in docs
+    ]
+    omitted: List[str] = []
+    while True:
+        response = {"articles": [dict(article, summary="") for article in articles]}
+        if omitted:
+            response["omitted_pmids"] = omitted
+        response["note"] = MORE_NOTE
+        overhead = _size(response)
+        summary_budget = max_chars - overhead
+        if articles and summary_budget < MIN_SUMMARY_CHARS * len(articles):
+            # not enough room for a useful abstract each; drop the last article
+            omitted.insert(0, articles.pop()["pmid"])
+            continue
+        break
+
+    slack = 0
+    while True:
+        allocation = _allocate([len(a["summary"]) for a in articles], summary_budget - slack)
+        response["articles"] = [
+            dict(article, summary=truncate_summary(article["summary"], chars))
+            for article, chars in zip(articles, allocation)
+        ]
+        text = json.dumps(response, ensure_ascii=False)
+        # JSON escaping of quotes and newlines can push us slightly over
+        if len(text) <= max_chars or summary_budget - slack <= 0:
+            return text
+        slack += len(text) - max_chars
+
+
+def truncate_summary(summary: str, max_chars: int) -> str:
+    """
+    Shorten an abstract to `max_chars`, dropping whole labelled sections
+    first and then cutting the last section at a sentence boundary.
+    """
+    if len(summary) <= max_chars:
+        return summary
+    limit = max(0, max_chars - len(TRUNCATION_MARK))
+    kept = ""
+    for section in summary.split("\n"):
+        candidate = kept + "\n" + section if kept else section
+        if len(candidate) <= limit:
+            kept = candidate
+            continue
+        room = limit - len(kept) - 1
+        if not kept:
+            kept = _cut_at_sentence(section, limit)
+        elif room >= MIN_PARTIAL_SECTION_CHARS:
+            kept += "\n" + _cut_at_sentence(section, room)
+        break
+    return kept + TRUNCATION_MARK
+
+
+def _cut_at_sentence(text: str, limit: int) -> str:
+    text = text[:limit]
+    match = None
+    for match in re.finditer(r"[.;!?](?=\s)", text):
+        pass
+    if match and match.end() > limit // 2:
+        return text[: match.end()]
+    return text.rsplit(" ", 1)[0] if " " in text else text
+
+
+def _allocate(lengths: List[int], budget: int) -> List[int]:
+    """
+    Share `budget` across items: short items get everything they need and
+    the rest is split evenly among the longer ones.
+    """
+    allocation = [0] * len(lengths)
+    remaining = max(0, budget)
+    pending: List[Tuple[int, int]] = sorted(enumerate(lengths), key=lambda item: item[1])
+    while pending:
+        share = remaining // len(pending)
+        index, length = pending.pop(0)
+        allocation[index] = min(length, share)
+        remaining -= allocation[index]
+    return allocation
+
+
+def _size(value: dict) -> int:
+    return len(json.dumps(value, ensure_ascii=False))
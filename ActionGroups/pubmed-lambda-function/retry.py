@@ -0,0 +1,181 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+import urllib.error
+from typing import Callable, Dict, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised when calls are short-circuited by an open CircuitBreaker."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a retry would run past the caller's deadline."""
+
+
+class CircuitBreaker():
+    """
+    Stops calling a failing service for `reset_timeout` seconds once
+    `failure_threshold` consecutive failures have been seen. After the
+    timeout a single trial call is let through (half-open); everyone else
+    is refused until it succeeds or fails. A trial that never reports back
+    is replaced by another one after a further `reset_timeout`.
+
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                return False
+            self._trial_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_started = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_started = None
+            if self._failures >= self.failure_threshold:
+                # (re)open, including after a failed half-open trial call
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy():
+    """
+    Retry configuration. All per-call state lives in `call`, so one policy
+    can be shared safely across calls, threads and warm invocations.
+
+    Delays use full jitter: a random value between 0 and
+    min(max_delay, base_delay * 2 ** attempt). A `Retry-After` header on
+    the error response takes precedence over the computed delay.
+
+    """
+    retry_codes = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        max_retry: int = 5,
+        base_delay: float = 0.2,
+        max_delay: float = 10.0,
+    ):
+        self.max_retry = max_retry
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, urllib.error.HTTPError):
+            return error.code in self.retry_codes
+        # connection resets, DNS hiccups and socket timeouts
+        return isinstance(error, (urllib.error.URLError, OSError))
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        deadline: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> T:
+        """
+        Call `fn` until it succeeds, fails with a non-retryable error or
+        `max_retry` retries are used up. `deadline` is an absolute
+        time.monotonic() value that no sleep may run past.
+        """
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError("Too many recent failures, not calling service")
+            try:
+                result = fn()
+            except Exception as e:
+                if breaker is not None:
+                    # a 429 or a client error means the service is up; 429s
+                    # are paced by Retry-After and backoff, not by the breaker
+                    if isinstance(e, urllib.error.HTTPError) and (e.code == 429 or not self.is_retryable(e)):
+                        breaker.record_success()
+                    elif self.is_retryable(e):
+                        breaker.record_failure()
+                if not self.is_retryable(e):
+                    raise
+                if attempt >= self.max_retry:
+                    raise
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = self.backoff(attempt)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise DeadlineExceededError(
+                        f"Giving up after {attempt + 1} attempts: {e}"
+                    ) from e
+                logger.warning(
+                    f"Request failed ({e}), retrying in {delay:.2f} seconds..."
+                )
+                time.sleep(delay)
+                attempt += 1
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(error, "headers", None)
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+# Module-level registry so breakers are shared by all clients in a warm
+# Lambda container.
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker()
+        return _breakers[name]
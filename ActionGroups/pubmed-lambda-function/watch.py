@@ -0,0 +1,51 @@
+"""
+Persistence for saved PubMed searches ("watch" mode).
+
+For every watched query we keep the date of the last run and the PMIDs
+seen on that run, so later runs only have to ask esearch for articles added
+since then. State is kept under PUBMED_WATCH_DIR (default
+/tmp/pubmed-watch) and, when PUBMED_WATCH_BUCKET is set, in S3 so it
+survives across Lambda containers.
+"""
+import os
+import tempfile
+from typing import Any, List, Optional
+
+from cache import DiskCache, S3Cache
+
+
+class SavedSearchStore():
+    """
+    Watch state for each query, keyed by normalized query. Writes go to
+    every configured tier; reads use the first tier that has the entry.
+
+    """
+
+    def __init__(self, tiers: Optional[List[Any]] = None):
+        if tiers is None:
+            tiers = [
+                DiskCache(
+                    os.environ.get(
+                        "PUBMED_WATCH_DIR", os.path.join(tempfile.gettempdir(), "pubmed-watch")
+                    )
+                )
+            ]
+            bucket = os.environ.get("PUBMED_WATCH_BUCKET")
+            if bucket:
+                tiers.insert(0, S3Cache(bucket, os.environ.get("PUBMED_WATCH_PREFIX", "pubmed-watch")))
+        self.tiers = tiers
+
+    def get(self, key: str) -> Optional[dict]:
+        for tier in self.tiers:
+            state = tier.get(key)
+            if state is not None:
+                return state
+        return None
+
+    def put(self, key: str, state: dict) -> None:
+        for tier in self.tiers:
+            tier.set(key, state)
+
+    def delete(self, key: str) -> None:
+        for tier in self.tiers:
+            tier.delete(key)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """In-process LRU cache with a per-entry TTL."""
+    name = 'memory'
+
+    def __init__(self, maxsize=512, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class DiskCache:
+    """
+    JSON file per entry under `directory`, meant for /tmp, which lasts as
+    long as the warm container. The oldest files are removed once more than
+    `max_entries` are stored.
+    """
+    name = 'disk'
+    prune_every = 100
+
+    def __init__(self, directory, ttl=None, max_entries=5000):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, digest(key) + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires') is not None and entry['expires'] < time.time():
+            self.delete(key)
+            return None
+        return entry.get('value')
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'expires': expires, 'value': value}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Could not write disk cache entry: {e}")
+            return
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class TieredCache:
+    """
+    Looks keys up tier by tier, fastest first, and copies hits back into
+    the faster tiers. Writes go to every tier.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self._hits = {tier.name: 0 for tier in tiers}
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                with self._lock:
+                    self._hits[tier.name] += 1
+                return value
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def delete(self, key):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            lookups = hits + self._misses
+            return {
+                'hits': dict(self._hits),
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+def build_cache(namespace, ttl, memory_size=512, shared=None):
+    """
+    Memory -> /tmp cache for `namespace`. The disk tier lives under
+    QUERY_CACHE_DIR (default /tmp/querydatabase-cache). `shared` is an
+    optional slower tier shared by every container, such as s3_cache.s3_tier.
+    """
+    tiers = [MemoryCache(memory_size, ttl)]
+    cache_dir = os.environ.get('QUERY_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'querydatabase-cache'))
+    try:
+        tiers.append(DiskCache(os.path.join(cache_dir, namespace), ttl))
+    except OSError as e:
+        print(f"Disk cache disabled: {e}")
+    if shared is not None:
+        tiers.append(shared)
+    return TieredCache(tiers)
+
+
+def digest(key):
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
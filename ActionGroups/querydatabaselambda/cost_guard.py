@@ -0,0 +1,112 @@
+"""
+Pre-execution cost check for agent-generated SQL.
+
+`CostGuard.check` runs EXPLAIN through the Data API and reads the planner's
+estimate for the top plan node, e.g.
+
+    XN HashAggregate  (cost=131.97..133.41 rows=576 width=17)
+
+Depending on the estimate, the query is then run as is, run with a LIMIT
+and a note asking the agent to aggregate, submitted without waiting, or
+rejected.
+"""
+import re
+
+from sql_fingerprint import Token, render, statement_kind, tokenize
+
+
+PLAN_ESTIMATE_RE = re.compile(r"cost=(?P<startup>[\d.]+)\.\.(?P<total>[\d.]+)\s+rows=(?P<rows>\d+)\s+width=(?P<width>\d+)")
+
+
+class QueryRejected(Exception):
+    """Raised when the estimated cost of a query is over the reject threshold."""
+
+
+class PlanEstimate:
+    def __init__(self, cost, rows, width, plan):
+        self.cost = cost
+        self.rows = rows
+        self.width = width
+        self.plan = plan
+
+    def __repr__(self):
+        return f"PlanEstimate(cost={self.cost}, rows={self.rows}, width={self.width})"
+
+
+class Decision:
+    """What to do with a query: action is 'run', 'limit' or 'async'."""
+
+    def __init__(self, action, sql, note=None, estimate=None):
+        self.action = action
+        self.sql = sql
+        self.note = note
+        self.estimate = estimate
+
+
+def parse_explain(plan_lines):
+    """The estimate of the first (top) node of an EXPLAIN plan."""
+    for line in plan_lines:
+        match = PLAN_ESTIMATE_RE.search(line)
+        if match:
+            return PlanEstimate(float(match.group('total')), int(match.group('rows')), int(match.group('width')),
+                                plan_lines)
+    raise ValueError("No cost estimate found in EXPLAIN output")
+
+
+def has_limit(sql):
+    """True if the outermost query has a LIMIT clause."""
+    depth = 0
+    for token in tokenize(sql):
+        if token.is_op('('):
+            depth += 1
+        elif token.is_op(')'):
+            depth -= 1
+        elif depth == 0 and token.is_word('limit'):
+            return True
+    return False
+
+
+def add_limit(sql, limit):
+    """Append LIMIT `limit` to the outermost query."""
+    return render(tokenize(sql) + [Token('word', 'limit'), Token('number', str(limit))])
+
+
+class CostGuard:
+    """
+    `max_rows`: queries estimated to return more rows get a LIMIT.
+    `async_cost`: queries estimated to cost more are submitted without
+    waiting for them; the agent gets the statement id to poll.
+    `reject_cost`: queries estimated to cost more are not run.
+    """
+
+    def __init__(self, executor, reader, max_rows=10000, async_cost=1e8, reject_cost=1e10):
+        self.executor = executor
+        self.reader = reader
+        self.max_rows = max_rows
+        self.async_cost = async_cost
+        self.reject_cost = reject_cost
+
+    def explain(self, sql, deadline=None):
+        statement = self.executor.execute(f"EXPLAIN {sql}", deadline)
+        result = self.reader.read_all(statement['Id'])
+        lines = [record[0].get('stringValue', '') for record in result['Records'] if record]
+        return parse_explain(lines)
+
+    def check(self, sql, deadline=None):
+        if statement_kind(sql) != 'select':
+            return Decision('run', sql)
+        estimate = self.explain(sql, deadline)
+        print(f"Query estimate: {estimate}")
+
+        if self.reject_cost and estimate.cost > self.reject_cost:
+            raise QueryRejected(
+                f"Query rejected: estimated cost {estimate.cost:.0f} is over the limit of {self.reject_cost:.0f}. "
+                f"Filter on fewer rows, select fewer columns or aggregate with GROUP BY.")
+        if self.async_cost and estimate.cost > self.async_cost:
+            return Decision('async', sql, note=f"Estimated cost {estimate.cost:.0f}; running in the background.",
+                            estimate=estimate)
+        if self.max_rows and estimate.rows > self.max_rows and not has_limit(sql):
+            note = (f"The query was estimated to return {estimate.rows} rows, so it was run with LIMIT {self.max_rows}. "
+                    f"Use COUNT, GROUP BY or other aggregates to summarize all rows.")
+            return Decision('limit', add_limit(sql, self.max_rows), note=note, estimate=estimate)
+        return Decision('run', sql, estimate=estimate)
@@ -3,23 +3,102 @@ import time
 import os
 import uuid
 import json
-import sys
+import hashlib
+import re
 from collections import defaultdict
+from cache import build_cache
+from cost_guard import CostGuard
+from result_cache import QueryResultCache
+from result_format import format_result
+from result_reader import ResultReader
+from s3_cache import s3_tier
+from schema_selector import ColumnIndex, select_columns
+from sql_fingerprint import is_write, normalize_sql, referenced_tables
+from sql_rewriter import rewrite
+from statement_executor import StatementExecutor, StatementPending
 
 redshift_client = boto3.client('redshift-data')
+bedrock_client = boto3.client('bedrock-runtime')
+executor = StatementExecutor(redshift_client, max_statement_seconds=int(os.environ.get('MAX_STATEMENT_SECONDS', 600)))
 
-def refineSQL(sql, question):
-    raw_schema = get_schema()
+# query results larger than the preview are streamed to S3 as gzip NDJSON
+result_reader = ResultReader(redshift_client, s3_client=boto3.client('s3'),
+                             bucket=os.environ.get('RESULT_BUCKET', os.environ.get('BUCKET_NAME')),
+                             prefix=os.environ.get('RESULT_PREFIX', 'query-results/'),
+                             preview_rows=int(os.environ.get('RESULT_PREVIEW_ROWS', 100)))
+# EXPLAIN-based limits for agent SQL; COST_GUARD=false turns the check off
+cost_guard = CostGuard(executor, result_reader,
+                       max_rows=int(os.environ.get('QUERY_MAX_ROWS', 10000)),
+                       async_cost=float(os.environ.get('QUERY_ASYNC_COST', 1e8)),
+                       reject_cost=float(os.environ.get('QUERY_REJECT_COST', 1e10))) \
+    if os.environ.get('COST_GUARD', 'true').lower() == 'true' else None
+# csv, markdown or json (columnar)
+RESULT_FORMAT = os.environ.get('RESULT_FORMAT', 'csv')
+
+# seconds kept in reserve to build the response before the Lambda times out
+DEADLINE_MARGIN = 5
+
+# query_redshift results by normalized SQL; RESULT_CACHE_TTL=0 disables the cache
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 900))
+result_cache = QueryResultCache(RESULT_CACHE_TTL) if RESULT_CACHE_TTL > 0 else None
+
+# try the local rule-based rewriter before asking the LLM in refineSQL
+LOCAL_SQL_REWRITER = os.environ.get('LOCAL_SQL_REWRITER', 'true').lower() == 'true'
+
+# refineSQL answers, "no change needed" included, by normalized SQL and question
+REFINE_CACHE_TTL = float(os.environ.get('REFINE_CACHE_TTL', 86400))
+refine_cache = build_cache('refine', ttl=REFINE_CACHE_TTL, memory_size=int(os.environ.get('REFINE_CACHE_SIZE', 256)),
+                           shared=s3_tier('refine', REFINE_CACHE_TTL))
+NO_SQL_FOUND = "No SQL found in response"
+EFFICIENT_QUERY_END = "</efficientQuery>"
+
+# at most this many columns beyond the key and referenced ones go into the
+# refineSQL prompt; 0 sends the whole schema
+SCHEMA_PROMPT_COLUMNS = int(os.environ.get('SCHEMA_PROMPT_COLUMNS', 20))
+column_indexes = {}
+
+# get_schema results, kept in memory and in /tmp for the life of the container
+SCHEMA_CACHE_KEY = 'dev:clinical_genomic'
+schema_cache = build_cache('schema', ttl=float(os.environ.get('SCHEMA_CACHE_TTL', 3600)))
+
+def refine_cache_key(sql, question):
+    question = re.sub(r'\s+', ' ', (question or '').strip().lower()).rstrip('?.! ')
+    return normalize_sql(sql or '') + '\n' + hashlib.sha256(question.encode('utf-8')).hexdigest()
+
+def refineSQL(sql, question, use_cache=True, deadline=None):
+    key = refine_cache_key(sql, question)
+    if use_cache:
+        cached = refine_cache.get(key)
+        if cached is not None:
+            print("Refined SQL served from cache")
+            return cached
+
+    result = generate_refined_sql(sql, question, deadline)
+    if result != NO_SQL_FOUND:
+        refine_cache.set(key, result)
+    return result
+
+def generate_refined_sql(sql, question, deadline=None):
+    raw_schema = get_schema(deadline=deadline)
     schema = extract_table_columns(raw_schema)
+
+    if LOCAL_SQL_REWRITER:
+        columns = [column['name'] for column in schema.get('clinical_genomic', [])]
+        local_result = rewrite(sql, question, columns=columns, table='clinical_genomic')
+        if local_result is not None:
+            print("Refined locally:", local_result)
+            return local_result
+
+    prompt_schema = prune_schema(schema, sql, question)
     
     prompt = f"""
     You are an extremely critical SQL query evaluation assistant. Your job is to analyze
     the given schema, SQL query, and question to ensure the query is efficient and accurately answers the 
     question. You should focus on making the query as efficient as possible, using aggregation when applicable.
 
-    Here is the schema you should consider:
+    Here is the schema you should consider. Only the columns relevant to this query are listed:
     <schema>
-    {json.dumps(schema)}
+    {json.dumps(prompt_schema)}
     </schema>
     
     Pay close attention to the accepted values and the column data type located in the comment field for each column.
@@ -70,7 +149,6 @@ def refineSQL(sql, question):
     
     Remember to prioritize aggregation when possible to reduce SQL output size and provide more meaningful results.
     """
-    client = boto3.client('bedrock-runtime')
     user_message = {"role": "user", "content": prompt}
     claude_response = {"role": "assistant", "content": "<efficientQuery>"}
     model_Id = 'anthropic.claude-3-5-sonnet-20240620-v1:0'
@@ -82,23 +160,67 @@ def refineSQL(sql, question):
         "messages": messages,
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": max_tokens,
-        "system": system_prompt
+        "system": system_prompt,
+        "stop_sequences": [EFFICIENT_QUERY_END]
     })
     
-    response = client.invoke_model(body=body, modelId=model_Id)
-    response_bytes = response.get("body").read()
-    response_text = response_bytes.decode('utf-8')
-    response_json = json.loads(response_text)
-    content = response_json.get('content', [])
-    for item in content:
-        if item.get('type') == 'text':
-            result_text = item.get('text')
-            print(result_text)
-            return result_text
+    result_text = stream_until(body, model_Id, EFFICIENT_QUERY_END)
+    if result_text:
+        print(result_text)
+        return result_text
     
-    return "No SQL found in response"
+    return NO_SQL_FOUND
+
+def prune_schema(schema, sql, question):
+    """Keep only the columns of each table that are relevant to `sql` and `question`."""
+    if SCHEMA_PROMPT_COLUMNS <= 0:
+        return schema
+    pruned = {}
+    for table, columns in schema.items():
+        key = (table, tuple(column['name'] for column in columns))
+        if key not in column_indexes:
+            column_indexes[key] = ColumnIndex(columns)
+        pruned[table] = select_columns(columns, sql, question, top_k=SCHEMA_PROMPT_COLUMNS, index=column_indexes[key])
+        print(f"Schema for {table} pruned to {len(pruned[table])} of {len(columns)} columns")
+    return pruned
+
+def stream_until(body, model_id, end_tag):
+    """
+    Stream a Claude response and return its text up to `end_tag`. Stops
+    reading as soon as the tag shows up, even if the stop sequence did not
+    end the stream.
+    """
+    response = bedrock_client.invoke_model_with_response_stream(body=body, modelId=model_id)
+    stream = response.get("body")
+    text = ''
+    try:
+        for event in stream:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            payload = json.loads(chunk['bytes'])
+            if payload.get('type') == 'content_block_delta':
+                text += payload.get('delta', {}).get('text', '')
+                if end_tag in text:
+                    text = text.split(end_tag, 1)[0]
+                    break
+            elif payload.get('type') == 'message_stop':
+                break
+    finally:
+        if hasattr(stream, 'close'):
+            stream.close()
+    return text.strip()
+
+def invalidate_schema_cache():
+    schema_cache.delete(SCHEMA_CACHE_KEY)
+
+def get_schema(refresh=False, deadline=None, statement_id=None):
+    if not refresh and not statement_id:
+        cached = schema_cache.get(SCHEMA_CACHE_KEY)
+        if cached is not None:
+            print("Schema served from cache")
+            return cached
 
-def get_schema():
     sql = """
         SELECT
             'clinical_genomic' AS table_name,
@@ -113,52 +235,56 @@ def get_schema():
             AND NOT a.attisdropped;"""
     
     try:
-        result = redshift_client.execute_statement(Database='dev', DbUser='admin', Sql=sql, ClusterIdentifier='biomarker-redshift-cluster')
-        print("SQL statement execution started. StatementId:", result['Id'])
-    
-        def wait_for_query_completion(statement_id):
-            while True:
-                response = redshift_client.describe_statement(Id=statement_id)
-                status = response['Status']
-                if status == 'FINISHED':
-                    print("SQL statement execution completed.")
-                    break
-                elif status in ['FAILED', 'CANCELLED']:
-                    print("SQL statement execution failed or was cancelled.")
-                    break
-                print("Waiting for SQL statement execution to complete...")
-                time.sleep(5)
-        
-        wait_for_query_completion(result['Id'])
+        if statement_id:
+            statement = executor.wait(statement_id, deadline)
+        else:
+            statement = executor.execute(sql, deadline)
         
-        response = redshift_client.get_statement_result(Id=result['Id'])
-        return response
+        schema = result_reader.read_all(statement['Id'])
+        schema_cache.set(SCHEMA_CACHE_KEY, schema)
+        return schema
+    except StatementPending:
+        raise
     except Exception as e:
         print("Error:", e)
         raise
 
-def query_redshift(query):
+def query_redshift(query, deadline=None, statement_id=None, use_cache=True):
+    decision = None
     try:
-        result = redshift_client.execute_statement(Database='dev', DbUser='admin', Sql=query, ClusterIdentifier='biomarker-redshift-cluster')
-        print("SQL statement execution started. StatementId:", result['Id'])
-    
-        def wait_for_query_completion(statement_id):
-            while True:
-                response = redshift_client.describe_statement(Id=statement_id)
-                status = response['Status']
-                if status == 'FINISHED':
-                    print("SQL statement execution completed.")
-                    break
-                elif status in ['FAILED', 'CANCELLED']:
-                    print("SQL statement execution failed or was cancelled.")
-                    break
-                print("Waiting for SQL statement execution to complete...")
-                time.sleep(5)
-        
-        wait_for_query_completion(result['Id'])
+        if statement_id:
+            statement = executor.wait(statement_id, deadline)
+            query = statement.get('QueryString', query)
+        else:
+            if use_cache and result_cache is not None and not is_write(query):
+                cached = result_cache.get(query)
+                if cached is not None:
+                    print("Query result served from cache")
+                    return cached
+            if cost_guard is not None:
+                decision = cost_guard.check(query, deadline)
+            if decision is not None and decision.action == 'async':
+                raise StatementPending(executor.submit(query), 'SUBMITTED')
+            if decision is not None and decision.action == 'limit':
+                print(decision.note)
+                statement = executor.execute(decision.sql, deadline)
+            else:
+                statement = executor.execute(query, deadline)
         
-        response = redshift_client.get_statement_result(Id=result['Id'])
-        return response
+        if statement.get('HasResultSet') is False:
+            result = {'ColumnMetadata': [], 'Records': [], 'TotalNumRows': max(statement.get('ResultRows', 0), 0)}
+        else:
+            result = result_reader.read(statement['Id'])
+            if decision is not None and decision.action == 'limit':
+                result['Note'] = decision.note
+        if result_cache is not None and query:
+            if is_write(query):
+                invalidate_tables(referenced_tables(query))
+            else:
+                result_cache.set(query, result)
+        return result
+    except StatementPending:
+        raise
     except Exception as e:
         print("Error:", e)
         raise
@@ -184,14 +310,34 @@ def upload_result_s3(result, bucket, key):
     s3object.put(Body=(bytes(json.dumps(result).encode('UTF-8'))))
     return s3object
 
+def invalidate_tables(tables):
+    """Drop the cached schema and the cached query results that read `tables`, e.g. after a reload."""
+    invalidate_schema_cache()
+    if result_cache is not None:
+        for table in tables:
+            result_cache.invalidate_table(table)
+
 def lambda_handler(event, context):
+    # direct invocation from a data load job: {"invalidateTables": ["clinical_genomic"]}
+    if 'invalidateTables' in event:
+        invalidate_tables(event['invalidateTables'])
+        return {'invalidated': event['invalidateTables']}
+
     result = None
     error_message = None
+    deadline = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - DEADLINE_MARGIN
 
     try:
         if event['apiPath'] == "/getschema":
-            raw_schema = get_schema()
-            result = extract_table_columns(raw_schema)
+            params = event.get('parameters') or []
+            refresh = any(param.get("name") == "refresh" and str(param.get("value")).lower() == "true" for param in params)
+            statement_id = next((param.get("value") for param in params if param.get("name") == "statement_id"), None)
+            try:
+                raw_schema = get_schema(refresh=refresh, deadline=deadline, statement_id=statement_id)
+                result = extract_table_columns(raw_schema)
+            except StatementPending as pending:
+                result = (f"Schema query is still running (status {pending.status}). Call /getschema again "
+                          f"with statement_id={pending.statement_id} to get the schema.")
 
         elif event['apiPath'] == "/refinesql":
             params =event['parameters']
@@ -203,16 +349,33 @@ def lambda_handler(event, context):
                     question = param.get("value")
                     print(question)
                 
-            result = refineSQL(sql, question)
+            try:
+                result = refineSQL(sql, question, deadline=deadline)
+                print(f"Refine cache: {refine_cache.stats()}")
+            except StatementPending as pending:
+                result = (f"Schema query is still running (status {pending.status}). Call /getschema "
+                          f"with statement_id={pending.statement_id}, then call /refinesql again.")
         
         elif event['apiPath'] == "/queryredshift":
             params =event['parameters']
+            query = None
+            statement_id = None
             for param in params:
                 if param.get("name") == "query":
                     query = param.get("value")
                     print(query)
+                if param.get("name") == "statement_id":
+                    statement_id = param.get("value")
+                    print(statement_id)
                 
-            result = query_redshift(query)
+            try:
+                result = format_result(query_redshift(query, deadline=deadline, statement_id=statement_id),
+                                       RESULT_FORMAT)
+                if result_cache is not None:
+                    print(f"Result cache: {result_cache.stats()}")
+            except StatementPending as pending:
+                result = (f"Query is still running (status {pending.status}). Call /queryredshift again "
+                          f"with statement_id={pending.statement_id} to get the result.")
 
         else:
             raise ValueError(f"Unknown apiPath: {event['apiPath']}")
@@ -226,7 +389,7 @@ def lambda_handler(event, context):
 
     BUCKET_NAME = os.environ['BUCKET_NAME']
     KEY = str(uuid.uuid4()) + '.json'
-    size = sys.getsizeof(str(result)) if result else 0
+    size = len(str(result).encode('utf-8')) if result else 0
     print(f"Response size: {size} bytes")
     
     if size > 20000:
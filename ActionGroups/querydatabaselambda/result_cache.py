@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+from cache import MemoryCache, build_cache
+from s3_cache import s3_tier
+from sql_fingerprint import fingerprint, referenced_tables
+
+
+class QueryResultCache:
+    """
+    Caches query_redshift results by the fingerprint of the normalized SQL
+    and the database, in memory, /tmp and, when QUERY_CACHE_BUCKET is set,
+    S3 (see s3_cache.s3_tier).
+
+    `invalidate_table` records when a table was reloaded. Entries cached
+    before that for queries reading the table are treated as misses. When
+    QUERY_CACHE_BUCKET is set the reload marks are also kept in S3, so the
+    other containers see them once their in-memory copy, including the
+    absence of a mark, expires after `reload_check_seconds`.
+    """
+
+    def __init__(self, ttl, database='dev', reload_check_seconds=30):
+        self.database = database
+        self.results = build_cache('results', ttl=ttl, memory_size=128, shared=s3_tier('results', ttl))
+        # reload marks seen by this container, 0.0 meaning "no mark", so a hit
+        # only goes to S3 for a table once every `reload_check_seconds`
+        self.reload_marks = MemoryCache(256, reload_check_seconds)
+        self.reload_store = s3_tier('reloads', ttl=None)
+        # counted here rather than by the tiers, which also count entries
+        # dropped for a reload as hits
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def key(self, sql):
+        return fingerprint(sql, self.database)
+
+    def get(self, sql):
+        entry = self.results.get(self.key(sql))
+        if entry is not None and any(self.reloaded_at(table) >= entry['cached_at'] for table in entry['tables']):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entry['result'] if entry is not None else None
+
+    def reloaded_at(self, table):
+        reloaded_at = self.reload_marks.get(table)
+        if reloaded_at is None:
+            if self.reload_store is not None:
+                reloaded_at = self.reload_store.get(table)
+            reloaded_at = reloaded_at or 0.0
+            self.reload_marks.set(table, reloaded_at)
+        return reloaded_at
+
+    def set(self, sql, result):
+        entry = {'result': result, 'tables': sorted(referenced_tables(sql)), 'cached_at': time.time()}
+        try:
+            json.dumps(entry)
+        except (TypeError, ValueError):
+            # e.g. blobValue fields; not worth caching
+            return
+        self.results.set(self.key(sql), entry)
+
+    def invalidate_table(self, table):
+        reloaded_at = time.time()
+        self.reload_marks.set(table.lower(), reloaded_at)
+        if self.reload_store is not None:
+            self.reload_store.set(table.lower(), reloaded_at)
+        print(f"Query result cache invalidated for table {table}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0.0,
+            }
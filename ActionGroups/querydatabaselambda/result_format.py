@@ -0,0 +1,117 @@
+"""
+Compact encodings of Redshift Data API results for the agent.
+
+`decode_result` turns Records + ColumnMetadata into typed columns, dropping
+the {'stringValue': ...} wrappers and response metadata. `format_result`
+renders them as CSV, a markdown table or columnar JSON, preceded by a
+one-line summary with the row counts, the S3 location of the full result
+when it was spilled, and the size of the table in bytes, followed by any
+note attached to the result (e.g. that a LIMIT was added).
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from result_reader import column_names, field_value
+
+
+FORMATS = ('csv', 'markdown', 'json')
+
+INTEGER_TYPES = {'int2', 'int4', 'int8', 'smallint', 'integer', 'bigint'}
+FLOAT_TYPES = {'float4', 'float8', 'real', 'double precision', 'float'}
+DECIMAL_TYPES = {'numeric', 'decimal'}
+BOOLEAN_TYPES = {'bool', 'boolean'}
+
+
+def decode_result(result):
+    """
+    Returns (columns, rows) where columns is a list of {'name', 'type'} and
+    rows are lists of Python values typed from the column's typeName.
+    """
+    metadata = result.get('ColumnMetadata', [])
+    names = column_names(metadata)
+    types = [(column.get('typeName') or '').lower() for column in metadata]
+    columns = [{'name': name, 'type': type_name} for name, type_name in zip(names, types)]
+    rows = [
+        [_convert(field_value(field), type_name) for field, type_name in zip(record, types)]
+        for record in result.get('Records', [])
+    ]
+    return columns, rows
+
+
+def format_result(result, fmt='csv'):
+    """Render a query_redshift result as a summary line plus a table in `fmt`."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown result format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    columns, rows = decode_result(result)
+    if fmt == 'json':
+        body = to_columnar_json(columns, rows)
+    elif fmt == 'markdown':
+        body = to_markdown(columns, rows)
+    else:
+        body = to_csv(columns, rows)
+
+    total_rows = result.get('TotalNumRows', len(rows))
+    summary = f"{total_rows} rows"
+    if total_rows > len(rows):
+        summary += f", showing the first {len(rows)}"
+    if result.get('ResultLocation'):
+        summary += f"; full result as gzip NDJSON at {result['ResultLocation']}"
+    summary += f"; {fmt}, {len(body.encode('utf-8'))} bytes"
+    if result.get('Note'):
+        summary += f"\nNote: {result['Note']}"
+    return summary + "\n" + body
+
+
+def to_csv(columns, rows):
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow([column['name'] for column in columns])
+    writer.writerows([['' if value is None else _text(value) for value in row] for row in rows])
+    return out.getvalue()
+
+
+def to_markdown(columns, rows):
+    def cell(value):
+        return '' if value is None else _text(value).replace('|', '\\|').replace('\n', ' ')
+
+    lines = ['| ' + ' | '.join(column['name'] for column in columns) + ' |',
+             '|' + '---|' * len(columns)]
+    lines.extend('| ' + ' | '.join(cell(value) for value in row) + ' |' for row in rows)
+    return '\n'.join(lines) + '\n'
+
+
+def to_columnar_json(columns, rows):
+    data = {
+        'columns': [column['name'] for column in columns],
+        'types': [column['type'] for column in columns],
+        'data': [list(values) for values in zip(*rows)] if rows else [[] for _ in columns],
+    }
+    return json.dumps(data, separators=(',', ':'), default=str)
+
+
+def _convert(value, type_name):
+    if value is None or not isinstance(value, str):
+        return value
+    try:
+        if type_name in INTEGER_TYPES:
+            return int(value)
+        if type_name in FLOAT_TYPES:
+            return float(value)
+        if type_name in DECIMAL_TYPES:
+            number = Decimal(value)
+            return int(number) if number == number.to_integral_value() else float(number)
+        if type_name in BOOLEAN_TYPES:
+            return value.lower() in ('t', 'true', '1')
+    except (ValueError, OverflowError, InvalidOperation):
+        pass
+    return value
+
+
+def _text(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,169 @@
+import json
+import zlib
+
+
+class S3GzipWriter:
+    """
+    Gzip-compresses bytes as they are written and uploads them to S3 in
+    `part_size` chunks with a multipart upload. Only the current part is held
+    in memory. Objects smaller than one part are written with a single
+    put_object.
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=8 * 1024 * 1024):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.bytes_written = 0
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        self._buffer += self._compressor.compress(data)
+        if len(self._buffer) >= self.part_size:
+            self._upload_part()
+
+    def close(self):
+        self._buffer += self._compressor.flush()
+        if self._upload_id is None:
+            self.s3_client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer),
+                                      ContentType='application/x-ndjson', ContentEncoding='gzip')
+        else:
+            self._upload_part()
+            self.s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                     MultipartUpload={'Parts': self._parts})
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self._upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                print(f"Could not abort multipart upload of s3://{self.bucket}/{self.key}: {e}")
+        self._buffer = bytearray()
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            upload = self.s3_client.create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                            ContentType='application/x-ndjson',
+                                                            ContentEncoding='gzip')
+            self._upload_id = upload['UploadId']
+        part_number = len(self._parts) + 1
+        response = self.s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              PartNumber=part_number, Body=bytes(self._buffer))
+        self._parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self._buffer = bytearray()
+
+
+class ResultReader:
+    """
+    Reads statement results page by page, following NextToken. The first
+    `preview_rows` records are kept in memory. Once a result grows past the
+    preview, every row is streamed as gzip-compressed NDJSON to
+    s3://`bucket`/`prefix`<statement id>.ndjson.gz and only the preview is
+    returned.
+    """
+
+    def __init__(self, client, s3_client=None, bucket=None, prefix='query-results/', preview_rows=100):
+        self.client = client
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.preview_rows = preview_rows
+
+    def iter_pages(self, statement_id):
+        """Yield every get_statement_result page of a finished statement."""
+        kwargs = {'Id': statement_id}
+        while True:
+            page = self.client.get_statement_result(**kwargs)
+            yield page
+            next_token = page.get('NextToken')
+            if not next_token:
+                return
+            kwargs['NextToken'] = next_token
+
+    def read_all(self, statement_id):
+        """Collect every page in memory. Only for results known to be small."""
+        records = []
+        column_metadata = []
+        for page in self.iter_pages(statement_id):
+            column_metadata = column_metadata or page.get('ColumnMetadata', [])
+            records.extend(page.get('Records', []))
+        return {'Records': records, 'ColumnMetadata': column_metadata}
+
+    def read(self, statement_id):
+        """
+        Returns a dict with the ColumnMetadata, the preview Records, the
+        TotalNumRows read and, when the result spilled, its ResultLocation.
+        """
+        column_metadata = []
+        preview = []
+        names = None
+        writer = None
+        total_rows = 0
+        try:
+            for page in self.iter_pages(statement_id):
+                if not column_metadata:
+                    column_metadata = page.get('ColumnMetadata', [])
+                    names = column_names(column_metadata)
+                for record in page.get('Records', []):
+                    total_rows += 1
+                    if total_rows <= self.preview_rows:
+                        preview.append(record)
+                        continue
+                    if writer is None:
+                        writer = self._open_writer(statement_id)
+                        for buffered in preview:
+                            writer.write(_ndjson_line(names, buffered))
+                    writer.write(_ndjson_line(names, record))
+            if writer is not None:
+                writer.close()
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        result = {'ColumnMetadata': column_metadata, 'Records': preview, 'TotalNumRows': total_rows}
+        if writer is not None:
+            result['ResultLocation'] = f"s3://{writer.bucket}/{writer.key}"
+            print(f"Streamed {total_rows} rows ({writer.bytes_written} bytes uncompressed) to {result['ResultLocation']}")
+        return result
+
+    def _open_writer(self, statement_id):
+        if self.s3_client is None or not self.bucket:
+            raise ValueError(f"Result of statement {statement_id} has more than {self.preview_rows} rows "
+                             "and no S3 bucket is configured to hold it")
+        return S3GzipWriter(self.s3_client, self.bucket, f"{self.prefix}{statement_id}.ndjson.gz")
+
+
+def field_value(field):
+    """Unwrap a Data API field such as {'stringValue': 'x'} to its Python value."""
+    if field.get('isNull'):
+        return None
+    for value in field.values():
+        return value
+    return None
+
+
+def column_names(column_metadata):
+    """Column labels, with repeated labels suffixed so they can be dict keys."""
+    names = []
+    seen = {}
+    for column in column_metadata:
+        name = column.get('label') or column.get('name') or f"column_{len(names) + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+def _ndjson_line(names, record):
+    row = {name: field_value(field) for name, field in zip(names, record)}
+    return (json.dumps(row, default=str) + '\n').encode('utf-8')
@@ -0,0 +1,66 @@
+import json
+import os
+import time
+
+import boto3
+
+from cache import digest
+
+
+class S3Cache:
+    """
+    JSON object per entry in an S3 bucket, shared by every container.
+    Expired objects are ignored on read; a bucket lifecycle rule on
+    `prefix` deletes them.
+    """
+    name = 's3'
+
+    def __init__(self, bucket, prefix, ttl=None):
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/') + '/'
+        self.ttl = ttl
+        self._s3 = boto3.client('s3')
+
+    def _key(self, key):
+        return self.prefix + digest(key) + '.json'
+
+    def get(self, key):
+        try:
+            response = self._s3.get_object(Bucket=self.bucket, Key=self._key(key))
+            entry = json.loads(response['Body'].read())
+        except self._s3.exceptions.NoSuchKey:
+            return None
+        except Exception as e:
+            print(f"Could not read S3 cache entry: {e}")
+            return None
+        if entry.get('expires') is not None and entry['expires'] < time.time():
+            return None
+        return entry.get('value')
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        body = json.dumps({'key': key, 'expires': expires, 'value': value})
+        try:
+            self._s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=body.encode('utf-8'))
+        except Exception as e:
+            print(f"Could not write S3 cache entry: {e}")
+
+    def delete(self, key):
+        try:
+            self._s3.delete_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            print(f"Could not delete S3 cache entry: {e}")
+
+
+def s3_tier(namespace, ttl):
+    """
+    S3 tier for `namespace` under QUERY_CACHE_PREFIX in QUERY_CACHE_BUCKET,
+    or None when no bucket is configured. The role then needs s3:GetObject
+    and s3:PutObject on the prefix and s3:ListBucket on the bucket, or
+    misses come back as AccessDenied instead of NoSuchKey.
+    """
+    bucket = os.environ.get('QUERY_CACHE_BUCKET')
+    if not bucket:
+        return None
+    prefix = os.environ.get('QUERY_CACHE_PREFIX', 'querydatabase-cache')
+    return S3Cache(bucket, f"{prefix}/{namespace}", ttl)
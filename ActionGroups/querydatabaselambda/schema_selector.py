@@ -0,0 +1,72 @@
+"""
+Picks the schema columns worth showing the model in the refineSQL prompt.
+
+`select_columns` keeps the key columns and every column the SQL refers
+to. It adds the `top_k` columns whose name and comment score best under
+BM25 against the question and the SQL's string literals, as long as they
+score at least `min_score_ratio` of the best match. Everything else, e.g.
+the many gene-expression columns a question does not mention, is left out
+of the prompt.
+"""
+import math
+import re
+from collections import Counter
+
+
+TERM_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'a', 'all', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'do', 'does', 'for', 'from', 'have', 'how', 'in', 'is',
+    'it', 'many', 'of', 'on', 'or', 'select', 'that', 'the', 'their', 'there', 'this', 'to', 'value', 'values',
+    'was', 'were', 'what', 'where', 'which', 'who', 'with',
+}
+
+
+def terms(text):
+    """Lower-cased words of `text`, split on anything that is not a letter or digit (underscores too)."""
+    return [term for term in TERM_RE.findall((text or '').lower()) if term not in STOPWORDS]
+
+
+class ColumnIndex:
+    """BM25 over one document per column: its name plus its comment."""
+
+    def __init__(self, columns, k1=1.2, b=0.75):
+        self.columns = columns
+        self.k1 = k1
+        self.b = b
+        self.docs = [Counter(terms(column['name']) + terms(column.get('comment'))) for column in columns]
+        self.lengths = [sum(doc.values()) for doc in self.docs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        document_frequency = Counter(term for doc in self.docs for term in doc)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query_terms):
+        query = set(query_terms)
+        scores = []
+        for doc, length in zip(self.docs, self.lengths):
+            score = 0.0
+            for term in query & doc.keys():
+                tf = doc[term]
+                norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+                score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+
+def select_columns(columns, sql, question, key_columns=('case_id',), top_k=20, min_score_ratio=0.5, index=None):
+    """
+    The subset of `columns` (dicts with name, type and comment) to put in
+    the prompt, in schema order.
+    """
+    index = index or ColumnIndex(columns)
+    sql_words = {word.lower() for word in re.findall(r"[A-Za-z_][A-Za-z0-9_$]*", sql or '')}
+    keep = {i for i, column in enumerate(columns)
+            if column['name'].lower() in sql_words or column['name'].lower() in key_columns}
+
+    literals = ' '.join(re.findall(r"'((?:[^']|'')*)'", sql or ''))
+    scores = index.scores(terms(question) + terms(literals))
+    threshold = max(scores, default=0.0) * min_score_ratio
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0 and score >= threshold and i not in keep),
+                    key=lambda i: scores[i], reverse=True)
+    keep.update(ranked[:top_k])
+    return [column for i, column in enumerate(columns) if i in keep]
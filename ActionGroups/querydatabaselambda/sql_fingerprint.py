@@ -0,0 +1,174 @@
+"""
+A small SQL tokenizer and normalizer.
+
+`normalize_sql` gives the canonical form used to fingerprint queries.
+Comments and a trailing semicolon are dropped, and whitespace is
+collapsed. Keywords and unquoted identifiers are lower-cased; string
+literals and quoted identifiers are left as written. Literal lists in
+`IN (...)` are sorted, so `x IN ('b', 'a')` and `x in ('a','b')` share a
+fingerprint.
+"""
+import hashlib
+import re
+
+
+TOKEN_RE = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><>|!=|<=|>=|::|\|\||[-+*/%=<>(),.;\[\]])
+  | (?P<other>.)
+""", re.S | re.X)
+
+LITERAL_KINDS = ('string', 'number')
+
+# words that keep a space before a following '(' when rendering
+KEYWORDS = {
+    'all', 'and', 'any', 'as', 'by', 'case', 'else', 'end', 'exists', 'from', 'group', 'having', 'in', 'join',
+    'limit', 'not', 'on', 'or', 'order', 'over', 'select', 'then', 'union', 'using', 'values', 'when', 'where', 'with',
+}
+
+WRITE_STATEMENTS = {'insert', 'update', 'delete', 'copy', 'truncate', 'alter', 'drop', 'create', 'merge', 'unload'}
+
+
+class Token:
+    __slots__ = ('kind', 'text')
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+
+    def __eq__(self, other):
+        return isinstance(other, Token) and (self.kind, self.text) == (other.kind, other.text)
+
+    def __repr__(self):
+        return f"Token({self.kind!r}, {self.text!r})"
+
+    def is_word(self, *words):
+        return self.kind == 'word' and (not words or self.text.lower() in words)
+
+    def is_op(self, *ops):
+        return self.kind == 'op' and (not ops or self.text in ops)
+
+
+def tokenize(sql, lower=True):
+    """Tokens of `sql` without whitespace and comments; words are lower-cased unless `lower` is false."""
+    tokens = []
+    for match in TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        if kind in ('ws', 'comment'):
+            continue
+        text = match.group()
+        tokens.append(Token(kind, text.lower() if kind == 'word' and lower else text))
+    while tokens and tokens[-1].is_op(';'):
+        tokens.pop()
+    return tokens
+
+
+def render(tokens):
+    """Join tokens back into a single line of SQL."""
+    parts = []
+    previous = None
+    for token in tokens:
+        if previous is not None and _needs_space(previous, token):
+            parts.append(' ')
+        parts.append(token.text)
+        previous = token
+    return ''.join(parts)
+
+
+def normalize_sql(sql):
+    return render(_sort_in_lists(tokenize(sql)))
+
+
+def fingerprint(sql, database=''):
+    """Stable hash of the normalized `sql` run against `database`."""
+    return hashlib.sha256(f"{database}\n{normalize_sql(sql)}".encode('utf-8')).hexdigest()
+
+
+def statement_kind(sql):
+    """The leading keyword of the statement, skipping any WITH clause: 'select', 'insert', ..."""
+    tokens = tokenize(sql)
+    if not tokens:
+        return ''
+    if tokens[0].is_word('with'):
+        depth = 0
+        for token in tokens:
+            if token.is_op('('):
+                depth += 1
+            elif token.is_op(')'):
+                depth -= 1
+            elif depth == 0 and token.kind == 'word' and token.text in WRITE_STATEMENTS | {'select'}:
+                return token.text
+        return 'select'
+    return tokens[0].text if tokens[0].kind == 'word' else ''
+
+
+def is_write(sql):
+    return statement_kind(sql) in WRITE_STATEMENTS
+
+
+def referenced_tables(sql):
+    """
+    Unqualified names of the tables a statement reads or writes, i.e. the
+    identifiers after FROM, JOIN, INTO, UPDATE, TABLE and COPY.
+    """
+    tokens = tokenize(sql)
+    tables = set()
+    for i, token in enumerate(tokens[:-1]):
+        if not token.is_word('from', 'join', 'into', 'update', 'table', 'copy'):
+            continue
+        j = i + 1
+        name = None
+        while j < len(tokens) and tokens[j].kind in ('word', 'quoted'):
+            name = tokens[j].text.strip('"').lower()
+            if j + 1 < len(tokens) and tokens[j + 1].is_op('.'):
+                j += 2
+                continue
+            break
+        if name and name not in KEYWORDS:
+            tables.add(name)
+    return tables
+
+
+def _sort_in_lists(tokens):
+    out = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        out.append(token)
+        i += 1
+        if not (token.is_word('in') and i < len(tokens) and tokens[i].is_op('(')):
+            continue
+        literals = []
+        j = i + 1
+        while j < len(tokens):
+            if tokens[j].kind not in LITERAL_KINDS:
+                break
+            literals.append(tokens[j])
+            j += 1
+            if j < len(tokens) and tokens[j].is_op(','):
+                j += 1
+                continue
+            break
+        if literals and j < len(tokens) and tokens[j].is_op(')') and tokens[j - 1].kind in LITERAL_KINDS:
+            unique = sorted({(t.kind, t.text) for t in literals})
+            out.append(tokens[i])
+            for n, (kind, text) in enumerate(unique):
+                if n:
+                    out.append(Token('op', ','))
+                out.append(Token(kind, text))
+            out.append(tokens[j])
+            i = j + 1
+    return out
+
+
+def _needs_space(previous, token):
+    if token.is_op(',', ')', '.', '::', ']') or previous.is_op('(', '.', '::', '['):
+        return False
+    if token.is_op('(') and previous.kind in ('word', 'quoted') and previous.text.lower() not in KEYWORDS:
+        return False
+    return True
@@ -0,0 +1,281 @@
+"""
+Deterministic rewrites for the common refineSQL cases.
+
+`rewrite` handles single-table SELECTs without joins, subqueries or set
+operations, which covers most of what the agent generates against
+clinical_genomic. It returns one of:
+
+- NO_CHANGE: the query already aggregates, over known columns, without
+  grouping by a key column or counting rows for a patient question.
+- A new single-line query. A row-level SELECT with a counting question
+  ("how many", "number of", "distribution", ...) is rewritten to
+  COUNT/GROUP BY. Columns pinned to a constant in the WHERE clause are
+  pruned from the projection. A patient or case count becomes
+  COUNT(DISTINCT <key column>).
+- None: the rewriter cannot decide, and the LLM should look at the query.
+"""
+import re
+
+from sql_fingerprint import KEYWORDS, LITERAL_KINDS, referenced_tables, render, tokenize
+
+
+NO_CHANGE = "no change needed"
+
+AGGREGATES = {'count', 'sum', 'avg', 'min', 'max', 'median', 'stddev', 'stddev_samp', 'stddev_pop', 'variance',
+              'var_samp', 'var_pop', 'listagg', 'percentile_cont', 'percentile_disc', 'approximate'}
+
+COUNT_INTENT_RE = re.compile(
+    r"\b(how many|number of|count|counts|distribution|breakdown|frequency)\b",
+    re.I)
+ENTITY_INTENT_RE = re.compile(r"\b(patients?|cases?|subjects?|individuals?|people)\b", re.I)
+
+CLAUSES = ('select', 'from', 'where', 'group', 'having', 'order', 'limit', 'offset')
+UNSUPPORTED = {'join', 'union', 'intersect', 'except', 'with', 'over', 'into', 'top'}
+# words in a simple SELECT that are neither columns nor functions
+NON_COLUMN_WORDS = KEYWORDS | {'asc', 'between', 'desc', 'distinct', 'false', 'first', 'ilike', 'interval', 'is',
+                               'last', 'like', 'null', 'nulls', 'offset', 'similar', 'to', 'true'}
+
+
+class SimpleSelect:
+    def __init__(self):
+        self.distinct = False
+        self.items = []
+        self.clauses = {}
+
+
+def parse_simple_select(sql):
+    """Split a single-table SELECT into its clauses, or return None if it is anything else."""
+    tokens = tokenize(sql, lower=False)
+    if not tokens or not tokens[0].is_word('select'):
+        return None
+    query = SimpleSelect()
+    current = None
+    depth = 0
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.is_op('('):
+            depth += 1
+        elif token.is_op(')'):
+            depth -= 1
+        if depth == 0 and token.kind == 'word':
+            word = token.text.lower()
+            if word in UNSUPPORTED:
+                return None
+            if word in CLAUSES:
+                if word in query.clauses:
+                    return None
+                current = word
+                query.clauses[current] = []
+                if word in ('group', 'order'):
+                    if i + 1 >= len(tokens) or not tokens[i + 1].is_word('by'):
+                        return None
+                    i += 1
+                i += 1
+                continue
+        if current is None:
+            return None
+        if depth > 0 and token.is_word('select'):
+            return None
+        query.clauses[current].append(token)
+        i += 1
+
+    select = query.clauses.get('select', [])
+    if select and select[0].is_word('distinct'):
+        query.distinct = True
+        select = select[1:]
+    query.items = _split_commas(select)
+    from_tokens = query.clauses.get('from', [])
+    if not query.items or not from_tokens or any(t.is_op(',', '(') for t in from_tokens):
+        return None
+    return query
+
+
+def rewrite(sql, question, key_columns=('case_id',), columns=None, table=None):
+    """
+    Returns NO_CHANGE, a rewritten single-line query, or None when the
+    rewriter cannot decide. `columns` are the column names of `table`, used
+    to check that the query only reads that table and known columns, and
+    that a key column exists before counting distinct values of it.
+    """
+    query = parse_simple_select(sql)
+    if query is None:
+        return None
+    if table is not None and referenced_tables(sql) != {table.lower()}:
+        return None
+    if columns is not None:
+        known = {column.lower() for column in columns}
+        if any(name not in known for name in _referenced_columns(query)):
+            # not the table we have the schema of, or a typo the LLM should fix
+            return None
+    wants_entities = bool(ENTITY_INTENT_RE.search(question or ''))
+
+    if any(_is_aggregate(item) for item in query.items):
+        group_by = _group_by_columns(query)
+        if any(name.lower() in key_columns for name in group_by):
+            # one row per patient is not an aggregate answer
+            return None
+        if wants_entities and any(_is_count_star(item) for item in query.items):
+            # rows, not patients; the row-level rewrite counts DISTINCT keys
+            return None
+        if all(_is_aggregate(item) or _column_name(item) in group_by for item in query.items):
+            return NO_CHANGE
+        return None
+    if 'group' in query.clauses or 'having' in query.clauses:
+        return None
+    if not COUNT_INTENT_RE.search(question or ''):
+        return None
+    if any(clause in query.clauses for clause in ('order', 'limit', 'offset')):
+        return None
+
+    star = any(len(item) == 1 and item[0].is_op('*') for item in query.items)
+    names = [_column_name(item) for item in query.items]
+    if not star and any(name is None for name in names):
+        return None
+
+    pinned = _pinned_columns(query.clauses.get('where', []))
+    keys = [key for key in key_columns if columns is not None and key in columns]
+    if star:
+        keep = []
+    else:
+        keep = [item for item, name in zip(query.items, names) if name.lower() not in pinned]
+
+    keep_names = [_column_name(item).lower() for item in keep]
+    if any(name in key_columns for name in keep_names):
+        if len(keep) == 1 and (query.distinct or wants_entities):
+            return _build(f"COUNT(DISTINCT {render(keep[0])}) AS num_patients", [], query)
+        return None
+
+    if query.distinct:
+        # "how many genders" over SELECT DISTINCT gender asks for the number
+        # of distinct values, not a per-value row count
+        return None
+    if wants_entities and keys:
+        count = f"COUNT(DISTINCT {keys[0]}) AS num_patients"
+    else:
+        count = "COUNT(*) AS count"
+    return _build(', '.join([render(item) for item in keep] + [count]), keep, query)
+
+
+def _build(select_list, group_by, query):
+    parts = [f"SELECT {select_list} FROM {render(query.clauses['from'])}"]
+    if query.clauses.get('where'):
+        parts.append(f"WHERE {render(query.clauses['where'])}")
+    if group_by:
+        parts.append("GROUP BY " + ', '.join(render(item) for item in group_by))
+    return ' '.join(parts) + ';'
+
+
+def _split_commas(tokens):
+    items = [[]]
+    depth = 0
+    for token in tokens:
+        if token.is_op('('):
+            depth += 1
+        elif token.is_op(')'):
+            depth -= 1
+        if depth == 0 and token.is_op(','):
+            items.append([])
+            continue
+        items[-1].append(token)
+    return [item for item in items if item]
+
+
+def _column_name(item):
+    """The column an item selects, for plain (optionally qualified) column references."""
+    if len(item) == 1 and item[0].kind in ('word', 'quoted'):
+        return item[0].text.strip('"')
+    if len(item) == 3 and item[1].is_op('.') and item[2].kind in ('word', 'quoted'):
+        return item[2].text.strip('"')
+    return None
+
+
+def _is_aggregate(item):
+    return any(token.kind == 'word' and token.text.lower() in AGGREGATES and i + 1 < len(item) and item[i + 1].is_op('(')
+               for i, token in enumerate(item))
+
+
+def _is_count_star(item):
+    return [token.text.lower() if token.kind == 'word' else token.text for token in item[:4]] == ['count', '(', '*', ')']
+
+
+def _referenced_columns(query):
+    """
+    Lower-cased identifiers the query reads outside FROM, leaving out
+    keywords, function names, table qualifiers, casts and AS aliases.
+    """
+    names = set()
+    aliases = set()
+    for clause, tokens in query.clauses.items():
+        if clause == 'from':
+            continue
+        for i, token in enumerate(tokens):
+            if token.kind not in ('word', 'quoted'):
+                continue
+            name = token.text.strip('"').lower()
+            previous = tokens[i - 1] if i else None
+            following = tokens[i + 1] if i + 1 < len(tokens) else None
+            if previous is not None and previous.is_word('as'):
+                aliases.add(name)
+            elif previous is not None and previous.is_op('::'):
+                continue
+            elif following is not None and following.is_op('(', '.'):
+                continue
+            elif token.kind == 'quoted' or name not in NON_COLUMN_WORDS:
+                names.add(name)
+    return names - aliases
+
+
+def _group_by_columns(query):
+    return {_column_name(item) for item in _split_commas(query.clauses.get('group', []))} - {None}
+
+
+def _pinned_columns(where):
+    """Lower-cased columns fixed to a single literal by a top-level `col = literal` conjunct."""
+    if any(token.is_word('or') for token in _top_level(where)):
+        return set()
+    pinned = set()
+    for conjunct in _split_and(where):
+        if len(conjunct) < 3:
+            continue
+        if conjunct[-2].is_op('=') and conjunct[-1].kind in LITERAL_KINDS:
+            name = _column_name(conjunct[:-2])
+        elif conjunct[1].is_op('=') and conjunct[0].kind in LITERAL_KINDS:
+            name = _column_name(conjunct[2:])
+        else:
+            continue
+        if name:
+            pinned.add(name.lower())
+    return pinned
+
+
+def _top_level(tokens):
+    depth = 0
+    for token in tokens:
+        if token.is_op('('):
+            depth += 1
+        elif token.is_op(')'):
+            depth -= 1
+        elif depth == 0:
+            yield token
+
+
+def _split_and(tokens):
+    conjuncts = [[]]
+    depth = 0
+    between = False
+    for token in tokens:
+        if token.is_op('('):
+            depth += 1
+        elif token.is_op(')'):
+            depth -= 1
+        if depth == 0 and token.is_word('between'):
+            between = True
+        elif depth == 0 and token.is_word('and'):
+            if between:
+                between = False
+            else:
+                conjuncts.append([])
+                continue
+        conjuncts[-1].append(token)
+    return conjuncts
@@ -0,0 +1,96 @@
+import time
+
+
+class StatementFailedError(Exception):
+    """Raised when a Redshift statement ends as FAILED or ABORTED."""
+
+
+class StatementPending(Exception):
+    """
+    Raised when a statement is still running at the caller's deadline.
+    `statement_id` can be passed to StatementExecutor.wait later, or back
+    to /queryredshift or /getschema as their statement_id parameter, to
+    resume.
+    """
+
+    def __init__(self, statement_id, status):
+        super().__init__(f"Statement {statement_id} is still {status}")
+        self.statement_id = statement_id
+        self.status = status
+
+
+class StatementExecutor:
+    """
+    Runs statements through the Redshift Data API and polls for completion
+    with exponential backoff, starting at `initial_delay` seconds and
+    growing by `backoff` up to `max_delay`. Polling stops at the deadline
+    passed by the caller. Statements running longer than
+    `max_statement_seconds` are cancelled.
+    """
+
+    def __init__(self, client, database='dev', db_user='admin', cluster_identifier='biomarker-redshift-cluster',
+                 initial_delay=0.05, max_delay=2.0, backoff=1.5, max_statement_seconds=600):
+        self.client = client
+        self.database = database
+        self.db_user = db_user
+        self.cluster_identifier = cluster_identifier
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_statement_seconds = max_statement_seconds
+
+    def execute(self, sql, deadline=None):
+        """
+        Run `sql` and wait until it finishes. Returns the final
+        describe_statement response. `deadline` is an absolute
+        time.monotonic() value.
+        """
+        return self.wait(self.submit(sql), deadline)
+
+    def submit(self, sql):
+        """Start `sql` without waiting for it. Returns the statement id."""
+        result = self.client.execute_statement(Database=self.database, DbUser=self.db_user, Sql=sql,
+                                               ClusterIdentifier=self.cluster_identifier)
+        print("SQL statement execution started. StatementId:", result['Id'])
+        return result['Id']
+
+    def wait(self, statement_id, deadline=None):
+        """
+        Poll an already submitted statement until it finishes, fails or the
+        deadline passes.
+        """
+        delay = self.initial_delay
+        while True:
+            response = self.client.describe_statement(Id=statement_id)
+            status = response['Status']
+            if status == 'FINISHED':
+                print(f"SQL statement execution completed in {response.get('Duration', 0) / 1e9:.3f} s.")
+                return response
+            if status in ('FAILED', 'ABORTED'):
+                raise StatementFailedError(f"Statement {statement_id} {status.lower()}: {response.get('Error', 'unknown error')}")
+
+            running_for = _running_seconds(response)
+            if running_for is not None and running_for > self.max_statement_seconds:
+                self.cancel(statement_id)
+                raise StatementFailedError(
+                    f"Statement {statement_id} cancelled after running for {running_for:.0f} s "
+                    f"(limit {self.max_statement_seconds} s)")
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise StatementPending(statement_id, status)
+
+            time.sleep(delay)
+            delay = min(delay * self.backoff, self.max_delay)
+
+    def cancel(self, statement_id):
+        try:
+            self.client.cancel_statement(Id=statement_id)
+            print(f"Cancelled statement {statement_id}")
+        except Exception as e:
+            print(f"Could not cancel statement {statement_id}: {e}")
+
+
+def _running_seconds(response):
+    created_at = response.get('CreatedAt')
+    if created_at is None or not hasattr(created_at, 'timestamp'):
+        return None
+    return time.time() - created_at.timestamp()
@@ -0,0 +1,150 @@
+"""
+Latency and throughput benchmark for the PubMed client.
+
+Starts the fake eutils server from fake_eutils.py, then runs
+`ConcurrentPubMed.run` for a batch of queries at each concurrency level and
+reports p50/p95/p99 latency, throughput, eutils requests per query and the
+number of 429 responses. For example:
+
+    python bench_pubmed.py --concurrency 1 4 8 --queries 40 --latency-ms 120 --error-rate 0.05
+
+By default every level starts with empty caches and distinct queries, so
+the numbers reflect the network path; --warm-cache repeats the same
+queries against warm caches instead. --rate sets the client-side rate
+limit (3 or 10 to reproduce NCBI's limits, the default leaves it off).
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAMBDA_DIR = os.path.join(HERE, "..", "..", "ActionGroups", "pubmed-lambda-function")
+
+# caches are created when PubMed is imported, so point them at a scratch
+# directory first
+CACHE_DIR = tempfile.mkdtemp(prefix="pubmed-bench-")
+os.environ["PUBMED_CACHE_DIR"] = CACHE_DIR
+os.environ.pop("PUBMED_CACHE_BUCKET", None)
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+import retry  # noqa: E402
+from ConcurrentPubMed import ConcurrentPubMed  # noqa: E402
+from fake_eutils import FakeEutils, load_fixtures  # noqa: E402
+
+TERMS = ["EGFR", "KRAS", "ALK", "PD-L1", "TP53", "STK11", "MET", "ROS1"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def clear_caches(client: ConcurrentPubMed) -> None:
+    for cache in (client.article_cache, client.query_cache):
+        for tier in cache.tiers:
+            tier.clear()
+
+
+def run_level(client: ConcurrentPubMed, fake: FakeEutils, queries: List[str], concurrency: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+
+    def timed(query: str):
+        start = time.perf_counter()
+        result = client.run(query)
+        return time.perf_counter() - start, result
+
+    fake.reset_counts()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed, result in pool.map(timed, queries):
+            latencies.append(elapsed * 1000)
+            if not isinstance(result, list):
+                errors += 1
+    wall = time.perf_counter() - start
+
+    requests = fake.counts["esearch"] + fake.counts["efetch"]
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else 0.0,
+        "throughput_qps": round(len(queries) / wall, 2) if wall else 0.0,
+        "requests_per_query": round(requests / len(queries), 2) if queries else 0.0,
+        "http_429": fake.counts["429"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the PubMed client against a fake eutils server.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=40, help="queries per concurrency level")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=1000.0, help="client rate limit in requests/second")
+    parser.add_argument("--warm-cache", action="store_true")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    class BenchPubMed(ConcurrentPubMed):
+        requests_per_second = args.rate
+        top_k_results = args.top_k
+
+    fake = FakeEutils(
+        load_fixtures(),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+    ).start()
+    client = BenchPubMed()
+    client.base_url_esearch = fake.base_url + "esearch.fcgi?"
+    client.base_url_efetch = fake.base_url + "efetch.fcgi?"
+
+    results = []
+    try:
+        for level, concurrency in enumerate(args.concurrency):
+            if args.warm_cache:
+                queries = [f"{TERMS[i % len(TERMS)]} survival" for i in range(args.queries)]
+                if level == 0:
+                    run_level(client, fake, queries, concurrency)
+            else:
+                clear_caches(client)
+                queries = [
+                    f"{TERMS[i % len(TERMS)]} survival cohort {level}-{i}"
+                    for i in range(args.queries)
+                ]
+            # failures from a previous level must not leave the breaker open
+            retry._breakers.clear()
+            results.append(run_level(client, fake, queries, concurrency))
+    finally:
+        fake.stop()
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    columns = list(results[0])
+    print("  ".join(f"{column:>18}" for column in columns))
+    for row in results:
+        print("  ".join(f"{row[column]!s:>18}" for column in columns))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Local stand-in for NCBI eutils (esearch and efetch) used by the PubMed
+client benchmarks.
+
+Articles come from recorded efetch XML files in `fixtures/`. esearch
+returns a deterministic slice of the fixture PMIDs for each query, and
+efetch returns the recorded records for the requested ids. Latency and
+429 responses can be injected to mimic NCBI under load.
+
+Run it standalone with:
+
+    python fake_eutils.py --port 8080 --latency-ms 150 --error-rate 0.05
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from xml.etree import ElementTree
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(directory: str = FIXTURE_DIR) -> Dict[str, bytes]:
+    """
+    Read every efetch XML file in `directory` and return the serialized
+    PubmedArticle element of each PMID.
+    """
+    records: Dict[str, bytes] = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.xml"))):
+        root = ElementTree.parse(path).getroot()
+        for article in root.findall("PubmedArticle"):
+            pmid = article.findtext("MedlineCitation/PMID")
+            records[pmid] = ElementTree.tostring(article, encoding="utf-8")
+    return records
+
+
+class FakeEutils():
+    """
+    Threaded HTTP server answering esearch.fcgi and efetch.fcgi.
+
+    `latency_ms` (+ up to `jitter_ms`) is added to every response and
+    `error_rate` of requests are answered with 429 and a Retry-After of
+    `retry_after` seconds.
+
+    """
+
+    def __init__(
+        self,
+        records: Dict[str, bytes],
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: float = 0.0,
+        port: int = 0,
+        seed: int = 0,
+    ):
+        self.records = records
+        self.pmids: List[str] = sorted(records)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.counts: Dict[str, int] = {"esearch": 0, "efetch": 0, "429": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/entrez/eutils/"
+
+    def start(self) -> "FakeEutils":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.counts = {key: 0 for key in self.counts}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _delay_and_fail(self) -> bool:
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+        time.sleep(delay / 1000)
+        return fail
+
+    def esearch(self, params: Dict[str, str]) -> bytes:
+        term = params.get("term", "")
+        retstart = int(params.get("retstart", 0))
+        retmax = int(params.get("retmax", 20))
+        # every query sees the fixture PMIDs in its own rotation
+        offset = zlib.crc32(term.encode("utf-8")) % len(self.pmids)
+        ranked = self.pmids[offset:] + self.pmids[:offset]
+        result = {
+            "esearchresult": {
+                "count": str(len(ranked)),
+                "retmax": str(retmax),
+                "retstart": str(retstart),
+                "idlist": ranked[retstart : retstart + retmax],
+                "querykey": "1",
+                "webenv": "MCID_fake",
+            }
+        }
+        return json.dumps(result).encode("utf-8")
+
+    def efetch(self, params: Dict[str, str]) -> bytes:
+        ids = [uid for uid in params.get("id", "").split(",") if uid in self.records]
+        return (
+            b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+            + b"\n".join(self.records[uid] for uid in ids)
+            + b"\n</PubmedArticleSet>\n"
+        )
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body go out in separate writes; without this a
+            # reused keep-alive connection waits on delayed ACKs (~40 ms)
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query))
+                endpoint = os.path.basename(url.path).split(".")[0]
+                if endpoint not in ("esearch", "efetch"):
+                    return self._send(404, b"unknown endpoint", "text/plain")
+                fake._count(endpoint)
+                if fake._delay_and_fail():
+                    fake._count("429")
+                    return self._send(
+                        429,
+                        b'{"error":"API rate limit exceeded"}',
+                        "application/json",
+                        {"Retry-After": str(fake.retry_after)},
+                    )
+                if endpoint == "esearch":
+                    return self._send(200, fake.esearch(params), "application/json")
+                return self._send(200, fake.efetch(params), "text/xml")
+
+            def _send(self, status, body, content_type, headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve recorded PubMed fixtures as a fake eutils.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeEutils(
+        load_fixtures(),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        port=args.port,
+    )
+    print(f"Serving {len(fake.pmids)} articles at {fake.base_url}")
+    fake._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()